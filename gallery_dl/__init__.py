@@ -188,7 +188,8 @@ def main():
         elif args.clear_cache:
             from . import cache
             log = logging.getLogger("cache")
-            cnt = cache.clear()
+            prefix = None if args.clear_cache is True else args.clear_cache
+            cnt = cache.clear(prefix)
 
             if cnt is None:
                 log.error("Database file not available")
@@ -197,6 +198,29 @@ def main():
                     "Deleted %d %s from '%s'",
                     cnt, "entry" if cnt == 1 else "entries", cache._path(),
                 )
+        elif args.cache_stats:
+            from . import cache
+            stats = cache.stats()
+
+            if stats is None:
+                logging.getLogger("cache").error(
+                    "Database file not available")
+            else:
+                fmt = "{:<60} {:>7} {:>7} {:>9} {:>7} {:>7}"
+                print(fmt.format(
+                    "Key", "Entries", "Expired", "Bytes", "Hits", "Misses"))
+                for key, entries, expired, size, hits, misses in stats:
+                    print(fmt.format(
+                        key, entries, expired or 0, size or 0, hits, misses))
+        elif args.catalog is not None:
+            from .postprocessor import catalog
+            try:
+                for path in catalog.query(args.catalog):
+                    print(path)
+            except (OSError, ValueError, catalog.sqlite3.Error) as exc:
+                logging.getLogger("catalog").error(
+                    "Unable to query catalog (%s: %s)",
+                    exc.__class__.__name__, exc)
         else:
             if not args.urls and not args.inputfile:
                 parser.error(
@@ -13,15 +13,23 @@ import pickle
 import time
 import os
 import functools
+import atexit
+import threading
+import collections
 from . import config, util
 
+_decorators = []
+
 
 class CacheDecorator():
     """Simplified in-memory cache"""
     def __init__(self, func, keyarg):
+        self.key = "%s.%s" % (func.__module__, func.__name__)
         self.func = func
         self.cache = {}
         self.keyarg = keyarg
+        self.hits = self.misses = 0
+        _decorators.append(self)
 
     def __get__(self, instance, cls):
         return functools.partial(self.__call__, instance)
@@ -30,8 +38,10 @@ class CacheDecorator():
         key = "" if self.keyarg is None else args[self.keyarg]
         try:
             value = self.cache[key]
+            self.hits += 1
         except KeyError:
             value = self.cache[key] = self.func(*args, **kwargs)
+            self.misses += 1
         return value
 
     def update(self, key, value):
@@ -61,29 +71,129 @@ class MemoryCacheDecorator(CacheDecorator):
             value = self.func(*args, **kwargs)
             expires = timestamp + self.maxage
             self.cache[key] = value, expires
+            self.misses += 1
+        else:
+            self.hits += 1
         return value
 
     def update(self, key, value):
         self.cache[key] = value, int(time.time()) + self.maxage
 
 
+class LRUCache():
+    """Bounded mapping discarding its least recently used entries"""
+
+    def __init__(self, maxsize):
+        self.data = collections.OrderedDict()
+        self.maxsize = maxsize
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def __getitem__(self, key):
+        with self.lock:
+            value = self.data[key]
+            self.data.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            if len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+                self.evictions += 1
+
+    def __delitem__(self, key):
+        with self.lock:
+            del self.data[key]
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __len__(self):
+        return len(self.data)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
 class DatabaseCacheDecorator():
     """Database cache"""
-    db = None
+    path = None
+    maxsize = 128
+    leasetime = 120
+    interval = 0.5
+    stripes = 16
+    _local = threading.local()
     _init = True
 
     def __init__(self, func, keyarg, maxage):
         self.key = "%s.%s" % (func.__module__, func.__name__)
         self.func = func
-        self.cache = {}
+        self.cache = LRUCache(self.maxsize)
+        self.locks = [threading.Lock() for _ in range(self.stripes)]
         self.keyarg = keyarg
         self.maxage = maxage
+        self.hits = self.misses = 0
+        _decorators.append(self)
 
     def __get__(self, obj, objtype):
         return functools.partial(self.__call__, obj)
 
     def __call__(self, *args, **kwargs):
         key = "" if self.keyarg is None else args[self.keyarg]
+        fullkey = "%s-%s" % (self.key, key)
+
+        try:
+            value = self._lookup(key, fullkey)
+            self.hits += 1
+            return value
+        except KeyError:
+            pass
+
+        # only one thread per process and only one process per database
+        # is allowed to call 'func' for a given key. Everyone else waits
+        # for its result to appear in the database.
+        lock = self.locks[hash(key) % self.stripes]
+        while True:
+            with lock:
+                try:
+                    value = self._lookup(key, fullkey)
+                    self.hits += 1
+                    return value
+                except KeyError:
+                    pass
+
+                if self._acquire(fullkey):
+                    try:
+                        value = self.func(*args, **kwargs)
+                    except BaseException:
+                        self._release(fullkey)
+                        raise
+                    self._store(key, fullkey, value, True)
+                    self.misses += 1
+                    return value
+
+            # another process holds the lease;
+            # don't block unrelated keys while waiting for it
+            time.sleep(self.interval)
+
+    def update(self, key, value):
+        self._store(key, "%s-%s" % (self.key, key), value)
+
+    def invalidate(self, key):
+        try:
+            del self.cache[key]
+        except KeyError:
+            pass
+        self.cursor().execute(
+            "DELETE FROM data WHERE key=?",
+            ("%s-%s" % (self.key, key),),
+        )
+
+    def _lookup(self, key, fullkey):
+        """Return an unexpired value for 'key' or raise KeyError"""
         timestamp = int(time.time())
 
         # in-memory cache lookup
@@ -95,60 +205,111 @@ class DatabaseCacheDecorator():
             pass
 
         # database lookup
-        fullkey = "%s-%s" % (self.key, key)
         cursor = self.cursor()
-        try:
-            cursor.execute("BEGIN EXCLUSIVE")
-        except sqlite3.OperationalError:
-            pass  # Silently swallow exception - workaround for Python 3.6
-        try:
-            cursor.execute(
-                "SELECT value, expires FROM data WHERE key=? LIMIT 1",
-                (fullkey,),
-            )
-            result = cursor.fetchone()
+        cursor.execute(
+            "SELECT value, expires FROM data WHERE key=? LIMIT 1",
+            (fullkey,),
+        )
+        result = cursor.fetchone()
 
-            if result and result[1] > timestamp:
-                value, expires = result
-                value = pickle.loads(value)
-            else:
-                value = self.func(*args, **kwargs)
-                expires = timestamp + self.maxage
-                cursor.execute(
-                    "INSERT OR REPLACE INTO data VALUES (?,?,?)",
-                    (fullkey, pickle.dumps(value), expires),
-                )
-        finally:
-            self.db.commit()
+        if not result or result[1] <= timestamp:
+            raise KeyError(key)
+        value, expires = result
+        value = pickle.loads(value)
         self.cache[key] = value, expires
         return value
 
-    def update(self, key, value):
+    def _store(self, key, fullkey, value, release=False):
         expires = int(time.time()) + self.maxage
         self.cache[key] = value, expires
+        cursor = self.cursor()
+        if not release:
+            cursor.execute(
+                "INSERT OR REPLACE INTO data VALUES (?,?,?)",
+                (fullkey, pickle.dumps(value), expires),
+            )
+            return
+
+        # store the new value and give up the lease in one transaction
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute(
+                "INSERT OR REPLACE INTO data VALUES (?,?,?)",
+                (fullkey, pickle.dumps(value), expires),
+            )
+            cursor.execute(
+                "DELETE FROM lease WHERE key=? AND owner=?",
+                (fullkey, self._owner()),
+            )
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            self._release(fullkey)
+            raise
+        cursor.execute("COMMIT")
+
+    def _acquire(self, fullkey):
+        """Try to obtain the lease to refresh 'fullkey'"""
+        timestamp = int(time.time())
+        # take over leases of crashed or stalled processes
+        cursor = self.cursor()
+        cursor.execute(
+            "INSERT OR REPLACE INTO lease SELECT ?, ?, ? WHERE NOT EXISTS "
+            "(SELECT 1 FROM lease WHERE key=? AND expires>=?)",
+            (fullkey, self._owner(), timestamp + self.leasetime,
+             fullkey, timestamp),
+        )
+        return cursor.rowcount == 1
+
+    def _release(self, fullkey):
         self.cursor().execute(
-            "INSERT OR REPLACE INTO data VALUES (?,?,?)",
-            ("%s-%s" % (self.key, key), pickle.dumps(value), expires),
+            "DELETE FROM lease WHERE key=? AND owner=?",
+            (fullkey, self._owner()),
         )
 
-    def invalidate(self, key):
+    @staticmethod
+    def _owner():
+        return "%d:%d" % (os.getpid(), threading.get_ident())
+
+    @classmethod
+    def cursor(cls):
+        return cls.connection().cursor()
+
+    @classmethod
+    def connection(cls):
+        """Return the database connection of the current thread"""
         try:
-            del self.cache[key]
-        except KeyError:
+            return cls._local.db
+        except AttributeError:
             pass
-        self.cursor().execute(
-            "DELETE FROM data WHERE key=? LIMIT 1",
-            ("%s-%s" % (self.key, key),),
-        )
 
-    def cursor(self):
-        if self._init:
-            self.db.execute(
+        # autocommit mode: each statement runs in its own short transaction
+        db = sqlite3.connect(cls.path, timeout=30, isolation_level=None)
+        try:
+            # let readers proceed while another process is writing
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+        except sqlite3.OperationalError:
+            pass  # WAL is not supported on all filesystems
+        cls._local.db = db
+
+        if cls._init:
+            db.execute(
                 "CREATE TABLE IF NOT EXISTS data "
                 "(key TEXT PRIMARY KEY, value TEXT, expires INTEGER)"
             )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS lease "
+                "(key TEXT PRIMARY KEY, owner TEXT, expires INTEGER)"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS stats "
+                "(key TEXT PRIMARY KEY, hits INTEGER, misses INTEGER)"
+            )
             DatabaseCacheDecorator._init = False
-        return self.db.cursor()
+            prune()
+            atexit.register(_store_stats)
+
+        return db
 
 
 def memcache(maxage=None, keyarg=None):
@@ -167,26 +328,111 @@ def cache(maxage=3600, keyarg=None):
     return wrap
 
 
-def clear():
-    """Delete all database entries"""
-    db = DatabaseCacheDecorator.db
+def clear(prefix=None):
+    """Delete all database entries or only those starting with 'prefix'
 
-    if db:
+    A 'prefix' without any dots is interpreted as extractor module name,
+    e.g. "pixiv" for "gallery_dl.extractor.pixiv.".
+    """
+    if DatabaseCacheDecorator.path:
         rowcount = 0
-        cursor = db.cursor()
         try:
-            cursor.execute("DELETE FROM data")
+            cursor = DatabaseCacheDecorator.cursor()
+            if prefix:
+                if "." not in prefix:
+                    prefix = "gallery_dl.extractor." + prefix + "."
+                for table in ("stats", "data"):
+                    cursor.execute(
+                        "DELETE FROM " + table +
+                        " WHERE substr(key, 1, ?) = ?",
+                        (len(prefix), prefix),
+                    )
+            else:
+                cursor.execute("DELETE FROM stats")
+                cursor.execute("DELETE FROM data")
         except sqlite3.OperationalError:
             pass  # database is not initialized,  can't be modified, etc.
         else:
             rowcount = cursor.rowcount
-            db.commit()
             cursor.execute("VACUUM")
         return rowcount
 
     return None
 
 
+def prune():
+    """Delete expired database entries"""
+    if DatabaseCacheDecorator.path:
+        timestamp = int(time.time())
+        try:
+            cursor = DatabaseCacheDecorator.cursor()
+            cursor.execute(
+                "DELETE FROM data WHERE expires <= ?", (timestamp,))
+            rowcount = cursor.rowcount
+            cursor.execute(
+                "DELETE FROM lease WHERE expires < ?", (timestamp,))
+        except sqlite3.OperationalError:
+            return 0
+        return rowcount
+
+    return None
+
+
+def stats():
+    """Return usage information for each cached function
+
+    Returns a list of (key, entries, expired, size, hits, misses) tuples,
+    where 'size' is the total size of all stored values in bytes.
+    """
+    if not DatabaseCacheDecorator.path:
+        return None
+
+    _store_stats()
+    result = {}
+    cursor = DatabaseCacheDecorator.cursor()
+
+    cursor.execute(
+        "SELECT substr(key, 1, instr(key, '-') - 1) AS prefix, "
+        "COUNT(*), SUM(expires <= ?), SUM(length(value)) "
+        "FROM data GROUP BY prefix",
+        (int(time.time()),),
+    )
+    for key, entries, expired, size in cursor:
+        result[key] = [key, entries, expired, size, 0, 0]
+
+    cursor.execute("SELECT key, hits, misses FROM stats")
+    for key, hits, misses in cursor:
+        if key not in result:
+            result[key] = [key, 0, 0, 0, 0, 0]
+        result[key][4:] = hits, misses
+
+    return [tuple(result[key]) for key in sorted(result)]
+
+
+def _store_stats():
+    """Add the hit and miss counters of all decorators to the database"""
+    rows = []
+    for deco in _decorators:
+        if deco.hits or deco.misses:
+            rows.append((deco.hits, deco.misses, deco.key))
+            deco.hits = deco.misses = 0
+    if not rows:
+        return
+
+    try:
+        cursor = DatabaseCacheDecorator.cursor()
+        cursor.executemany(
+            "INSERT OR IGNORE INTO stats VALUES (?, 0, 0)",
+            [(row[2],) for row in rows],
+        )
+        cursor.executemany(
+            "UPDATE stats SET hits=hits+?, misses=misses+? WHERE key=?",
+            rows,
+        )
+    except sqlite3.Error:
+        pass
+
+
 def _path():
     path = config.get(("cache", "file"), -1)
     if path != -1:
@@ -207,7 +453,9 @@ try:
     if os.name != "nt":
         # restrict access permissions for new db files
         os.close(os.open(dbfile, os.O_CREAT | os.O_RDONLY, 0o600))
-    DatabaseCacheDecorator.db = sqlite3.connect(
-        dbfile, timeout=30, check_same_thread=False)
+    DatabaseCacheDecorator.path = dbfile
+    DatabaseCacheDecorator.maxsize = config.get(("cache", "memory-size"), 128)
+    DatabaseCacheDecorator.connection()
 except (OSError, TypeError, sqlite3.OperationalError):
+    DatabaseCacheDecorator.path = None
     cache = memcache  # noqa: F811
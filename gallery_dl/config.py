@@ -12,8 +12,14 @@ import sys
 import json
 import os.path
 import logging
+import threading
 from . import util
 
+try:
+    import contextvars
+except ImportError:
+    contextvars = None
+
 log = logging.getLogger("config")
 
 
@@ -21,6 +27,8 @@ log = logging.getLogger("config")
 # internals
 
 _config = {}
+_version = 0
+_snapshots = {}
 
 if os.name == "nt":
     _default_configs = [
@@ -35,6 +43,78 @@ else:
     ]
 
 
+def _invalidate():
+    """Discard all cached snapshots"""
+    global _version
+    _version += 1
+    _snapshots.clear()
+
+
+def _current():
+    """Return the active configuration dict and its snapshot cache"""
+    overlay = _context.get()
+    if overlay is None:
+        return _config, _snapshots
+    if overlay.version != _version:
+        overlay.update()
+    return overlay.config, overlay.snapshots
+
+
+class _Overlay():
+    """Layered view of the global configuration and local key-value pairs"""
+
+    def __init__(self, parent, kvlist):
+        self.parent = parent
+        self.kvlist = kvlist
+        self.version = -1
+        self.config = None
+        self.snapshots = {}
+
+    def update(self):
+        version = _version
+        if self.parent:
+            if self.parent.version != version:
+                self.parent.update()
+            conf = self.parent.config.copy()
+        else:
+            conf = _config.copy()
+
+        # copy all dicts along the path of each key
+        # to leave the underlying layers untouched
+        for keys, value in self.kvlist:
+            parent = conf
+            for k in keys[:-1]:
+                child = parent.get(k)
+                parent[k] = child = \
+                    child.copy() if isinstance(child, dict) else {}
+                parent = child
+            parent[keys[-1]] = value
+
+        self.config = conf
+        self.snapshots = {}
+        self.version = version
+
+
+if contextvars:
+    _context = contextvars.ContextVar("config", default=None)
+else:
+    class _ContextVar(threading.local):
+        """Minimal thread-local stand-in for contextvars.ContextVar"""
+        value = None
+
+        def get(self):
+            return self.value
+
+        def set(self, value):
+            token, self.value = self.value, value
+            return token
+
+        def reset(self, token):
+            self.value = token
+
+    _context = _ContextVar()
+
+
 # --------------------------------------------------------------------
 # public interface
 
@@ -68,15 +148,19 @@ def load(files=None, strict=False, fmt="json"):
                 _config.update(confdict)
             else:
                 util.combine_dict(_config, confdict)
+            _invalidate()
 
 
 def clear():
     """Reset configuration to an empty state"""
     _config.clear()
+    _invalidate()
 
 
-def get(keys, default=None, conf=_config):
+def get(keys, default=None, conf=None):
     """Get the value of property 'key' or a default value"""
+    if conf is None:
+        conf = _current()[0]
     try:
         for k in keys:
             conf = conf[k]
@@ -85,8 +169,10 @@ def get(keys, default=None, conf=_config):
         return default
 
 
-def interpolate(keys, default=None, conf=_config):
+def interpolate(keys, default=None, conf=None):
     """Interpolate the value of 'key'"""
+    if conf is None:
+        conf = _current()[0]
     try:
         lkey = keys[-1]
         if lkey in conf:
@@ -100,6 +186,36 @@ def interpolate(keys, default=None, conf=_config):
         return default
 
 
+def snapshot(keys):
+    """Return a flat dict of all values visible to 'interpolate(keys + key)'
+
+    The result gets cached until the next modification of the global
+    configuration and must therefore not be modified by the caller.
+    """
+    root, cache = _current()
+    try:
+        return cache[keys]
+    except KeyError:
+        pass
+
+    version = _version
+    result = {}
+    conf = root
+    for k in keys:
+        try:
+            conf = conf[k]
+        except (KeyError, TypeError):
+            break
+        if not isinstance(conf, dict):
+            break
+        result.update(conf)
+    result.update(root)
+
+    if version == _version:
+        cache[keys] = result
+    return result
+
+
 def set(keys, value, conf=_config):
     """Set the value of property 'key' for this session"""
     for k in keys[:-1]:
@@ -110,6 +226,7 @@ def set(keys, value, conf=_config):
             conf[k] = temp
             conf = temp
     conf[keys[-1]] = value
+    _invalidate()
 
 
 def setdefault(keys, value, conf=_config):
@@ -121,6 +238,7 @@ def setdefault(keys, value, conf=_config):
             temp = {}
             conf[k] = temp
             conf = temp
+    _invalidate()
     return conf.setdefault(keys[-1], value)
 
 
@@ -132,24 +250,37 @@ def unset(keys, conf=_config):
         del conf[keys[-1]]
     except (KeyError, AttributeError):
         pass
+    else:
+        _invalidate()
 
 
 class apply():
-    """Context Manager: apply a collection of key-value pairs"""
-    _sentinel = object()
+    """Context Manager: apply a collection of key-value pairs
+
+    These values are only visible in the current thread or asyncio task
+    and leave the global configuration unchanged.
+    """
 
     def __init__(self, kvlist):
-        self.original = []
         self.kvlist = kvlist
+        self.token = None
 
     def __enter__(self):
-        for key, value in self.kvlist:
-            self.original.append((key, get(key, self._sentinel)))
-            set(key, value)
+        overlay = _Overlay(_context.get(), self.kvlist)
+        self.token = _context.set(overlay)
 
     def __exit__(self, etype, value, traceback):
-        for key, value in self.original:
-            if value is self._sentinel:
-                unset(key)
-            else:
-                set(key, value)
+        _context.reset(self.token)
+
+
+def bind(func):
+    """Return a wrapper calling 'func' with the currently applied values"""
+    overlay = _context.get()
+
+    def wrap(*args, **kwargs):
+        token = _context.set(overlay)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _context.reset(token)
+    return wrap
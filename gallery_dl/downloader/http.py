@@ -10,6 +10,7 @@
 
 import os
 import time
+import hashlib
 import mimetypes
 from requests.exceptions import RequestException, ConnectionError, Timeout
 from .common import DownloaderBase
@@ -32,6 +33,7 @@ class HttpDownloader(DownloaderBase):
         self.verify = self.config("verify", extractor._verify)
         self.mtime = self.config("mtime", True)
         self.rate = self.config("rate")
+        self.hashes = self.config("hash")
         self.downloading = False
         self.chunk_size = 16384
 
@@ -44,6 +46,22 @@ class HttpDownloader(DownloaderBase):
             elif rate < self.chunk_size:
                 self.chunk_size = rate
             self.rate = rate
+        if self.hashes:
+            if isinstance(self.hashes, str):
+                self.hashes = (self.hashes,)
+            hashes = []
+            for name in self.hashes:
+                try:
+                    hashlib.new(name)
+                except (ValueError, TypeError):
+                    self.log.warning("Unsupported hash algorithm (%r)", name)
+                else:
+                    hashes.append(name)
+            self.hashes = hashes
+            self.verify_hash = self.config("hash-verify", True)
+            self.manifest = self.config("hash-manifest", False)
+            if self.manifest is True and hashes:
+                self.manifest = hashes[0].upper() + "SUMS"
 
     def download(self, url, pathfmt):
         try:
@@ -53,18 +71,24 @@ class HttpDownloader(DownloaderBase):
             raise
         finally:
             # remove file from incomplete downloads
-            if self.downloading and not self.part:
-                try:
-                    os.unlink(pathfmt.temppath)
-                except (OSError, AttributeError):
-                    pass
+            if self.downloading:
+                if pathfmt.writer:
+                    pathfmt.writer.discard(pathfmt)
+                elif not self.part:
+                    try:
+                        os.unlink(pathfmt.temppath)
+                    except (OSError, AttributeError):
+                        pass
 
     def _download_impl(self, url, pathfmt):
         response = None
+        hashes = None
         tries = 0
         msg = ""
 
-        if self.part:
+        # data written into an archive entry can't be resumed
+        writer = pathfmt.writer
+        if self.part and not writer:
             pathfmt.part_enable(self.partdir)
 
         while True:
@@ -78,7 +102,7 @@ class HttpDownloader(DownloaderBase):
             tries += 1
 
             # check for .part file
-            filesize = pathfmt.part_size()
+            filesize = 0 if writer else pathfmt.part_size()
             if filesize:
                 headers = {"Range": "bytes={}-".format(filesize)}
             else:
@@ -105,6 +129,13 @@ class HttpDownloader(DownloaderBase):
                 offset = filesize
                 size = response.headers["Content-Range"].rpartition("/")[2]
             elif code == 416 and filesize:  # Requested Range Not Satisfiable
+                if self.hashes:
+                    with pathfmt.open("r+b") as file:
+                        hashes = self._hash_file(file, filesize)
+                        msg = self._check_hashes(hashes, pathfmt.kwdict)
+                        if msg:
+                            file.truncate(0)
+                            continue
                 break
             else:
                 msg = "{}: {} for url: {}".format(code, response.reason, url)
@@ -134,12 +165,15 @@ class HttpDownloader(DownloaderBase):
             self.out.start(pathfmt.path)
             self.downloading = True
             with pathfmt.open(mode) as file:
+                if self.hashes:
+                    # include already downloaded data
+                    hashes = self._hash_file(file, offset)
                 if offset:
                     file.seek(offset)
 
                 # download content
                 try:
-                    self.receive(response, file)
+                    self.receive(response, file, hashes)
                 except (RequestException, SSLError) as exc:
                     msg = str(exc)
                     print()
@@ -152,6 +186,17 @@ class HttpDownloader(DownloaderBase):
                     print()
                     continue
 
+                # check file hashes
+                if hashes:
+                    msg = self._check_hashes(hashes, pathfmt.kwdict)
+                    if msg:
+                        print()
+                        if not pathfmt.writer:
+                            # start over instead of resuming
+                            file.seek(0)
+                            file.truncate()
+                        continue
+
                 # check filename extension
                 if self.adjust_extension:
                     adj_ext = self.check_extension(file, pathfmt.extension)
@@ -161,17 +206,35 @@ class HttpDownloader(DownloaderBase):
             break
 
         self.downloading = False
+        kwdict = pathfmt.kwdict
         if self.mtime:
-            pathfmt.kwdict["_mtime"] = response.headers.get("Last-Modified")
+            kwdict["_mtime"] = response.headers.get("Last-Modified")
+
+        digests = {}
+        if hashes:
+            for name, digest in hashes.items():
+                digests[name] = digest = digest.hexdigest()
+                # keep checksums advertised for a different file
+                if kwdict.get("_original") or not kwdict.get(name):
+                    kwdict[name] = digest
+            if self.manifest:
+                self._write_manifest(pathfmt, digests[self.hashes[0]])
+        # let postprocessors know which file these checksums belong to
+        kwdict["_download"] = (pathfmt.realpath, digests)
         return True
 
-    def receive(self, response, file):
+    def receive(self, response, file, hashes=None):
         if self.rate:
             total = 0            # total amount of bytes received
             start = time.time()  # start time
+        if hashes:
+            update = [digest.update for digest in hashes.values()]
 
         for data in response.iter_content(self.chunk_size):
             file.write(data)
+            if hashes:
+                for func in update:
+                    func(data)
 
             if self.rate:
                 total += len(data)
@@ -181,6 +244,55 @@ class HttpDownloader(DownloaderBase):
                     # sleep if less time passed than expected
                     time.sleep(expected - delta)
 
+    def _hash_file(self, file, size):
+        """Return hash objects for the first 'size' bytes of 'file'"""
+        hashes = {name: hashlib.new(name) for name in self.hashes}
+        if size:
+            file.seek(0)
+            while size > 0:
+                data = file.read(min(size, 65536))
+                if not data:
+                    break
+                for digest in hashes.values():
+                    digest.update(data)
+                size -= len(data)
+        return hashes
+
+    def _check_hashes(self, hashes, kwdict):
+        """Compare 'hashes' against checksums provided in 'kwdict'
+
+        Only files marked as '_original' by their extractor have to match.
+        For unmarked files, a mismatch only causes a warning, and files
+        marked as not original, e.g. samples, don't get checked at all.
+        """
+        original = kwdict.get("_original")
+        if not self.verify_hash or original is False:
+            return None
+        for name, digest in hashes.items():
+            expected = kwdict.get(name)
+            if not expected or not isinstance(expected, str):
+                continue
+            digest = digest.hexdigest()
+            if len(expected) == len(digest) and \
+                    expected.lower() != digest:
+                msg = "{} mismatch ({} != {})".format(
+                    name, digest, expected)
+                if original:
+                    return msg
+                self.log.warning("%s; unable to tell if '%s' is the file "
+                                 "it belongs to", msg, name)
+        return None
+
+    def _write_manifest(self, pathfmt, digest):
+        """Add an entry for the downloaded file to its directory's manifest"""
+        path = os.path.join(pathfmt.realdirectory, self.manifest)
+        try:
+            with open(path, "a", encoding="utf-8") as file:
+                file.write("{}  {}\n".format(digest, pathfmt.filename))
+        except OSError as exc:
+            self.log.warning("Unable to write to '%s' (%s: %s)",
+                             path, exc.__class__.__name__, exc)
+
     def get_extension(self, response):
         mtype = response.headers.get("Content-Type", "image/jpeg")
         mtype = mtype.partition(";")[0]
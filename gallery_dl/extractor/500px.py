@@ -19,10 +19,12 @@ class _500pxExtractor(Extractor):
     filename_fmt = "{id}_{name}.{extension}"
     archive_fmt = "{id}"
     root = "https://500px.com"
+    per_page = 50
 
     def __init__(self, match):
         Extractor.__init__(self, match)
         self.session.headers["Referer"] = self.root + "/"
+        self.page_start = 1
 
     def items(self):
         first = True
@@ -39,6 +41,11 @@ class _500pxExtractor(Extractor):
                 yield Message.Directory, photo
             yield Message.Url, url, photo
 
+    def skip(self, num):
+        pages = num // self.per_page
+        self.page_start += pages
+        return pages * self.per_page
+
     def metadata(self):
         """Returns general metadata"""
 
@@ -73,7 +80,8 @@ class _500pxExtractor(Extractor):
         return self.request(url, headers=headers, params=params).json()
 
     def _pagination(self, url, params, csrf):
-        params["page"] = 1
+        params["rpp"] = self.per_page
+        params["page"] = self.page_start
         while True:
             data = self._api_call(url, params, csrf)
             yield from self._extend(data["photos"])
@@ -110,7 +118,6 @@ class _500pxUserExtractor(_500pxExtractor):
         params = {
             "feature"       : "user",
             "stream"        : "photos",
-            "rpp"           : "50",
             "user_id"       : user_id,
         }
         return self._pagination(url, params, csrf_token)
@@ -163,7 +170,6 @@ class _500pxGalleryExtractor(_500pxExtractor):
         params = {
             "sort"             : "position",
             "sort_direction"   : "asc",
-            "rpp"              : "50",
         }
         return self._pagination(url, params, self.csrf_token)
 
@@ -221,6 +227,9 @@ class _500pxImageExtractor(_500pxExtractor):
         _500pxExtractor.__init__(self, match)
         self.photo_id = match.group(1)
 
+    def skip(self, _):
+        return 0
+
     def photos(self):
         photos = ({"id": self.photo_id},)
         return self._extend(photos)
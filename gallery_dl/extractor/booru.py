@@ -9,11 +9,15 @@
 """Base classes for extractors for danbooru and co"""
 
 from .common import Extractor, Message, SharedConfigMixin
-from .. import text, exception
+from .. import text, util, config, cache, exception
 from xml.etree import ElementTree
 import collections
+import sqlite3
+import bisect
 import datetime
 import operator
+import json
+import time
 import re
 
 
@@ -26,6 +30,8 @@ class BooruExtractor(SharedConfigMixin, Extractor):
     per_page = 50
     page_start = 1
     page_limit = None
+    page_numbers = False
+    seekable = False
     sort = False
     ugoira = True
 
@@ -33,6 +39,9 @@ class BooruExtractor(SharedConfigMixin, Extractor):
         super().__init__(match)
         self.params = {}
         self.extags = self.post_url and self.config("tags", False)
+        self.tagcache = TagCache(self.category) if self.extags else None
+        self.seek = False
+        self.predicate = None
 
     def skip(self, num):
         pages = num // self.per_page
@@ -41,36 +50,103 @@ class BooruExtractor(SharedConfigMixin, Extractor):
         self.page_start += pages
         return pages * self.per_page
 
+    def init_predicate(self, predicate):
+        # check files before requesting their post pages,
+        # unless an 'image-filter' needs their extended tags
+        if self.extags and self.post_url and \
+                "tags_" not in self.config("image-filter", ""):
+            self.predicate = predicate
+            return True
+        return False
+
     def items(self):
         yield Message.Version, 1
         data = self.get_metadata()
 
-        self.reset_page()
-        while True:
-            images = self.parse_response(
-                self.request(self.api_url, params=self.params))
-
-            for image in images:
-                try:
-                    if "pixiv_ugoira_frame_data" in image and \
-                            "large_file_url" in image and not self.ugoira:
-                        url = image["large_file_url"]
-                    else:
-                        url = image["file_url"]
-                except KeyError:
-                    continue
-                if url.startswith("/"):
-                    url = text.urljoin(self.api_url, url)
-                image.update(data)
-                text.nameext_from_url(url, image)
-                if self.extags:
-                    self.extended_tags(image)
+        for params, images in self.pages(data):
+            self.checkpoint(params)
+            files = self.files(images, data)
+            if self.extags:
+                files = self.lookup_tags(files)
+
+            for url, image in files:
                 yield Message.Directory, image
                 yield Message.Url, url, image
 
-            if len(images) < self.per_page:
-                return
-            self.update_page(image)
+    def files(self, images, data):
+        """Yield the URL and metadata of all files in 'images'"""
+        for image in images:
+            try:
+                if "pixiv_ugoira_frame_data" in image and \
+                        "large_file_url" in image and not self.ugoira:
+                    # webm sample; 'md5' is the checksum of the ZIP file
+                    url = image["large_file_url"]
+                    original = False
+                else:
+                    url = image["file_url"]
+                    original = True
+            except KeyError:
+                continue
+            if url.startswith("/"):
+                url = text.urljoin(self.api_url, url)
+            image["_original"] = original
+            image.update(data)
+            text.nameext_from_url(url, image)
+            yield url, image
+
+    def pages(self, data):
+        """Yield request parameters and results of all API pages
+
+        With 'prefetch' enabled, the following pages get requested in
+        background threads while the results of the current one are
+        being processed.
+        """
+        self.reset_page()
+        resumed = self.resume_page()
+        archived = self.archived_ids(data) if self.seek else None
+        if archived and not resumed:
+            self.seek_page(archived)
+
+        prefetch = self.config("prefetch", 0)
+        if prefetch is True:
+            prefetch = 1
+        if prefetch and not self.page_numbers:
+            # the next cursor is only known after receiving a page
+            prefetch = 1
+
+        def submit():
+            params = self.params.copy()
+            pages.submit(params, params)
+
+        with util.Lookahead(config.bind(self.fetch_page), prefetch) as pages:
+            submit()
+            if prefetch and self.page_numbers:
+                for _ in range(prefetch - 1):
+                    self.update_page(None)
+                    submit()
+
+            while pages:
+                params, images = pages.pop()
+
+                if len(images) < self.per_page:
+                    yield params, images
+                    return
+
+                if self.page_numbers:
+                    self.update_page(None)
+                else:
+                    image = images[-1]
+                    self.update_page(image)
+                    if archived and any(
+                            _contains(archived, img["id"]) for img in images):
+                        # seek again after reaching already downloaded posts
+                        self.seek_page(archived, image["id"])
+                submit()
+                yield params, images
+
+    def fetch_page(self, params):
+        """Request and parse the API page described by 'params'"""
+        return self.parse_response(self.request(self.api_url, params=params))
 
     def reset_page(self):
         """Initialize params to point to the first page"""
@@ -79,6 +155,70 @@ class BooruExtractor(SharedConfigMixin, Extractor):
     def update_page(self, data):
         """Update params to point to the next page"""
 
+    def resume_page(self):
+        """Update params to point to a page from a saved checkpoint"""
+        params = self.resume()
+        if params:
+            self.params = params
+            return True
+        return False
+
+    def archived_ids(self, data):
+        """Return a sorted list of all post IDs in the download archive"""
+        path = self.config("archive")
+        if not path:
+            return None
+        archive = util.DownloadArchive(util.expand_path(path), self)
+        try:
+            ids = archive.values(data, "id")
+        except Exception as exc:
+            self.log.debug("Unable to read archive entries (%s: %s)",
+                           exc.__class__.__name__, exc)
+            return None
+        finally:
+            archive.close()
+        return sorted(int(i) for i in ids if i.isdecimal())
+
+    def seek_page(self, archived, before=None):
+        """Move params past all posts below 'before' that are archived"""
+        end = bisect.bisect_left(archived, before) if before else \
+            len(archived)
+
+        def complete(num):
+            # are the 'num' archived IDs below 'before' all posts there?
+            if before:
+                tags = "{} id:{}..{}".format(
+                    self.tags, archived[end-num], before - 1)
+            else:
+                tags = "{} id:>={}".format(self.tags, archived[end-num])
+            return self.post_count(tags) == num
+
+        if not end or not complete(1):
+            return
+
+        # exponential search for the longest complete stretch
+        good, bad = 1, None
+        while good < end:
+            num = min(good * 2, end)
+            if complete(num):
+                good = num
+            else:
+                bad = num
+                break
+        if bad:
+            while bad - good > 1:
+                num = (good + bad) // 2
+                if complete(num):
+                    good = num
+                else:
+                    bad = num
+
+        self.log.debug("Skipping %d archived posts", good)
+        self.update_page({"id": archived[end-good]})
+
+    def post_count(self, tags):
+        """Return the number of posts matching 'tags'"""
+
     def parse_response(self, response):
         """Parse JSON API response"""
         images = response.json()
@@ -91,18 +231,152 @@ class BooruExtractor(SharedConfigMixin, Extractor):
         """Collect metadata for extractor-job"""
         return {}
 
+    def lookup_tags(self, files):
+        """Add extended tags to all 'files' and yield them
+
+        Post pages get requested by up to 'tags-workers' threads ahead of
+        time and their results are stored in a TagCache. Files rejected
+        by the job's predicate are skipped without requesting their post
+        page.
+        """
+        files = list(files)
+        cached = self.tagcache.get([image["id"] for _, image in files])
+        fetched = []
+
+        def update(entry):
+            (url, image), tags = entry
+            if str(image["id"]) not in cached:
+                fetched.append((image["id"], tags))
+            image.update(tags)
+            return url, image
+
+        predicate = self.predicate
+        workers = self.config("tags-workers", 4)
+        stop = None
+
+        try:
+            with util.Lookahead(config.bind(self._fetch_tags),
+                                workers if workers > 1 else 0) as lookups:
+                for url, image in files:
+                    if predicate:
+                        try:
+                            if not predicate(url, image):
+                                self.position += 1
+                                continue
+                        except exception.StopExtraction as exc:
+                            # still process files accepted before this one
+                            stop = exc
+                            break
+
+                    tags = cached.get(str(image["id"]))
+                    if tags is None:
+                        lookups.submit((url, image),
+                                       self.post_url.format(image["id"]))
+                    else:
+                        lookups.put((url, image), tags)
+                    if len(lookups) >= workers:
+                        yield update(lookups.pop())
+
+                while lookups:
+                    yield update(lookups.pop())
+                if stop:
+                    raise stop
+        finally:
+            self.tagcache.put(fetched)
+
     def extended_tags(self, image, page=None):
         """Retrieve extended tag information"""
-        if not page:
-            url = self.post_url.format(image["id"])
-            page = self.request(url).text
-        tags = collections.defaultdict(list)
-        tags_html = text.extract(page, '<ul id="tag-', '</ul>')[0]
-        pattern = re.compile(r"tag-type-([^\"' ]+).*?[?;]tags=([^\"']+)", re.S)
-        for tag_type, tag_name in pattern.findall(tags_html or ""):
-            tags[tag_type].append(text.unquote(tag_name))
-        for key, value in tags.items():
-            image["tags_" + key] = " ".join(value)
+        if page:
+            image.update(_parse_tags(page))
+        else:
+            image.update(self._fetch_tags(self.post_url.format(image["id"])))
+
+    def _fetch_tags(self, url):
+        return _parse_tags(self.request(url).text)
+
+
+class TagCache():
+    """Extended tags of booru posts, stored by post ID
+
+    Tags for all posts of an API page get read with a single query
+    and newly fetched ones get written in one transaction afterwards.
+    Without a cache database, they are only kept in memory.
+    """
+    maxage = 30*24*3600
+    _init = True
+
+    def __init__(self, category):
+        self.category = category
+        self.memory = {}
+
+    def get(self, ids):
+        """Return a dict mapping post IDs to their unexpired tags"""
+        ids = [str(i) for i in ids]
+        result = {i: self.memory[i] for i in ids if i in self.memory}
+        cursor = self.cursor()
+        if not cursor or not ids:
+            return result
+        try:
+            cursor.execute(
+                "SELECT id, tags FROM booru_tags WHERE category=? "
+                "AND expires>? AND id IN (" + ",".join("?" * len(ids)) + ")",
+                [self.category, int(time.time())] + ids,
+            )
+            for post_id, tags in cursor:
+                result[post_id] = json.loads(tags)
+        except sqlite3.Error:
+            pass
+        return result
+
+    def put(self, entries):
+        """Store a list of (post ID, tags) pairs"""
+        if not entries:
+            return
+        rows = []
+        expires = int(time.time()) + self.maxage
+        for post_id, tags in entries:
+            self.memory[str(post_id)] = tags
+            rows.append((self.category, str(post_id),
+                         json.dumps(tags), expires))
+
+        cursor = self.cursor()
+        if not cursor:
+            return
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                cursor.executemany(
+                    "INSERT OR REPLACE INTO booru_tags VALUES (?,?,?,?)",
+                    rows,
+                )
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+            cursor.execute("COMMIT")
+        except sqlite3.Error:
+            pass
+
+    @classmethod
+    def cursor(cls):
+        """Return a cursor of the cache database or None"""
+        if not cache.DatabaseCacheDecorator.path:
+            return None
+        try:
+            cursor = cache.DatabaseCacheDecorator.cursor()
+            if cls._init:
+                cursor.execute(
+                    "CREATE TABLE IF NOT EXISTS booru_tags "
+                    "(category TEXT, id TEXT, tags TEXT, expires INTEGER, "
+                    "PRIMARY KEY (category, id)) WITHOUT ROWID"
+                )
+                cursor.execute(
+                    "DELETE FROM booru_tags WHERE expires <= ?",
+                    (int(time.time()),),
+                )
+                TagCache._init = False
+        except sqlite3.Error:
+            return None
+        return cursor
 
 
 class XmlParserMixin():
@@ -114,12 +388,27 @@ class XmlParserMixin():
 
 class DanbooruPageMixin():
     """Pagination for Danbooru v2"""
+    seekable = True
+
     def update_page(self, data):
         self.params["page"] = "b{}".format(data["id"])
 
+    def post_count(self, tags):
+        url = self.api_url.rpartition("/")[0] + "/counts/posts.json"
+        data = self.request(url, params={"tags": tags}).json()
+        return data["counts"]["posts"]
+
 
 class MoebooruPageMixin():
     """Pagination for Moebooru and Danbooru v1"""
+    @property
+    def page_numbers(self):
+        return not self.page_limit
+
+    @property
+    def seekable(self):
+        return bool(self.page_limit)
+
     def update_page(self, data):
         if self.page_limit:
             self.params["page"] = None
@@ -127,9 +416,16 @@ class MoebooruPageMixin():
         else:
             self.params["page"] += 1
 
+    def post_count(self, tags):
+        url = self.api_url.replace(".json", ".xml")
+        params = {"tags": tags, "limit": "1"}
+        root = ElementTree.fromstring(self.request(url, params=params).text)
+        return text.parse_int(root.get("count"))
+
 
 class GelbooruPageMixin():
     """Pagination for Gelbooru-like sites"""
+    page_numbers = True
     page_start = 0
 
     def reset_page(self):
@@ -150,6 +446,9 @@ class TagMixin():
         self.tags = text.unquote(match.group("tags").replace("+", " "))
         self.params["tags"] = self.tags
         self.params["limit"] = self.per_page
+        if "order:" not in self.tags and "sort:" not in self.tags:
+            self.watermark = "id"
+            self.seek = self.seekable and self.config("archive-seek", False)
 
     def get_metadata(self):
         return {"search_tags": self.tags}
@@ -194,6 +493,14 @@ class GelbooruPoolMixin(PoolMixin):
         self.index = self.page_start
         self.update_page(None)
 
+    def resume_page(self):
+        if not super().resume_page():
+            return False
+        post = self.params["tags"][3:]
+        if post in self.posts:
+            self.index = self.posts.index(post) + 1
+        return True
+
     def update_page(self, data):
         try:
             post = self.posts[self.index]
@@ -268,3 +575,19 @@ class MoebooruPopularMixin(PopularMixin):
         if self.scale and self.scale.startswith("by_"):
             return self.scale[3:]
         return self.scale
+
+
+def _parse_tags(page):
+    """Collect 'tags_<type>' fields from a post's HTML page"""
+    tags = collections.defaultdict(list)
+    tags_html = text.extract(page, '<ul id="tag-', '</ul>')[0]
+    pattern = re.compile(r"tag-type-([^\"' ]+).*?[?;]tags=([^\"']+)", re.S)
+    for tag_type, tag_name in pattern.findall(tags_html or ""):
+        tags[tag_type].append(text.unquote(tag_name))
+    return {"tags_" + key: " ".join(value) for key, value in tags.items()}
+
+
+def _contains(values, value):
+    """Return True if sorted list 'values' contains 'value'"""
+    index = bisect.bisect_left(values, value)
+    return index < len(values) and values[index] == value
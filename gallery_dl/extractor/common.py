@@ -19,6 +19,7 @@ import threading
 import http.cookiejar
 from .message import Message
 from .. import config, text, util, exception, cloudflare
+from ..cache import cache
 
 
 class Extractor():
@@ -30,6 +31,9 @@ class Extractor():
     filename_fmt = "{filename}.{extension}"
     archive_fmt = ""
     cookiedomain = ""
+    watermark = None
+    date_field = None
+    ordered = "image"
     root = ""
     test = None
 
@@ -44,6 +48,11 @@ class Extractor():
         self._timeout = self.config("timeout", 30)
         self._verify = self.config("verify", True)
         self._cookiefile = None
+        self._checkpoint = False
+        self._checkpoint_saved = False
+        self._cursor = None
+        self._watermark = None
+        self.position = 0
 
         if self._retries < 0:
             self._retries = float("inf")
@@ -65,8 +74,84 @@ class Extractor():
         return 0
 
     def config(self, key, default=None):
-        return config.interpolate(
-            ("extractor", self.category, self.subcategory, key), default)
+        return config.snapshot(
+            ("extractor", self.category, self.subcategory)).get(key, default)
+
+    def init_checkpoint(self):
+        """Enable checkpoints and load a saved one when resuming"""
+        self._checkpoint = self.config("checkpoint", True)
+        if self._checkpoint and self.config("resume", False):
+            state = _checkpoint_cache(self.url)
+            if state:
+                self._cursor, self.position = state
+                self._checkpoint_saved = True
+
+    def checkpoint(self, cursor, name=None):
+        """Save 'cursor' as the point to resume pagination from
+
+        Should be called right before requesting the page 'cursor' points
+        to, when all results of previous pages have been processed.
+        """
+        if self._checkpoint:
+            _checkpoint_cache.update(self.url, ((name, cursor), self.position))
+            self._checkpoint_saved = True
+
+    def resume(self, name=None):
+        """Return the cursor of a saved checkpoint for 'name' or None"""
+        if self._cursor and self._cursor[0] == name:
+            cursor = self._cursor[1]
+            self._cursor = None
+            self.log.info("Resuming from checkpoint after %d files",
+                          self.position)
+            return cursor
+        return None
+
+    def date_predicate(self):
+        """Return a predicate for 'date-min' and 'date-max'
+
+        Only available for results ordered by 'date_field', newest first.
+        """
+        if not self.date_field:
+            return None
+        dmin, dmax = self._get_date_min_max()
+        if dmin is None and dmax is None:
+            return None
+        return util.DatePredicate(self.date_field, dmin, dmax)
+
+    def init_predicate(self, predicate):
+        """Offer the job's file 'predicate' to the extractor
+
+        Return True if the extractor checks its files itself,
+        e.g. to avoid requesting additional metadata for skipped files.
+        """
+        return False
+
+    def init_watermark(self):
+        """Return a predicate skipping files older than the last run's"""
+        incremental = self.config("incremental", False)
+        if not incremental or not self.watermark:
+            return None
+        limit = 3 if incremental is True else incremental
+        self._watermark = util.WatermarkPredicate(
+            self.watermark, _watermark_cache(self.url), limit)
+        return self._watermark
+
+    def complete(self, stopped=False):
+        """Handle the successful completion of an extractor run
+
+        'stopped' indicates an early end through StopExtraction.
+        """
+        if self._checkpoint_saved:
+            _checkpoint_cache.invalidate(self.url)
+            self._checkpoint_saved = False
+
+        # only store a new watermark if all files newer than it
+        # got downloaded, i.e. without failures and without stopping
+        # early for anything but reaching the previous watermark
+        watermark = self._watermark
+        if watermark and watermark.value is not None and \
+                not watermark.failed and (watermark.reached or not stopped):
+            _watermark_cache.update(self.url, watermark.value)
 
     def request(self, url, method="GET", *, session=None, retries=None,
                 encoding=None, fatal=True, notfound=None, **kwargs):
@@ -367,7 +452,7 @@ class AsynchronousMixin():
     def __iter__(self):
         messages = queue.Queue(5)
         thread = threading.Thread(
-            target=self.async_items,
+            target=config.bind(self.async_items),
             args=(messages,),
             daemon=True,
         )
@@ -400,9 +485,9 @@ class SharedConfigMixin():
     def config(self, key, default=None, *, sentinel=object()):
         value = Extractor.config(self, key, sentinel)
         if value is sentinel:
-            cat, self.category = self.category, self.basecategory
-            value = Extractor.config(self, key, default)
-            self.category = cat
+            value = config.snapshot(
+                ("extractor", self.basecategory, self.subcategory),
+            ).get(key, default)
         return value
 
 
@@ -448,6 +533,16 @@ def generate_extractors(extractor_data, symtable, classes):
             symtable[Extr.__name__] = prev = Extr
 
 
+@cache(maxage=30*24*3600, keyarg=0)
+def _checkpoint_cache(url):
+    return None
+
+
+@cache(maxage=10*365*24*3600, keyarg=0)
+def _watermark_cache(url):
+    return None
+
+
 # Reduce strictness of the expected magic string in cookiejar files.
 # (This allows the use of Wget-generated cookiejars without modification)
 http.cookiejar.MozillaCookieJar.magic_re = re.compile(
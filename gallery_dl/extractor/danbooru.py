@@ -29,12 +29,21 @@ class DanbooruExtractor(booru.DanbooruPageMixin, booru.BooruExtractor):
         self.api_url = "{scheme}://{subdomain}.donmai.us/posts.json".format(
             scheme=self.scheme, subdomain=self.subdomain)
         self.ugoira = self.config("ugoira", True)
+        self.extags = self.config("tags", False)
 
         username, api_key = self._get_auth_info()
         if username:
             self.log.debug("Using HTTP Basic Auth for user '%s'", username)
             self.session.auth = (username, api_key)
 
+    def lookup_tags(self, files):
+        # API results already include tags grouped by type
+        for url, image in files:
+            for key in ("artist", "character", "copyright",
+                        "general", "meta"):
+                image["tags_" + key] = image.get("tag_string_" + key, "")
+            yield url, image
+
 
 class DanbooruTagExtractor(booru.TagMixin, DanbooruExtractor):
     """Extractor for images from danbooru based on search-tags"""
@@ -263,6 +263,7 @@ class DeviantartExtractor(Extractor):
 class DeviantartGalleryExtractor(DeviantartExtractor):
     """Extractor for all deviations from an artist's gallery"""
     subcategory = "gallery"
+    date_field = "date"
     archive_fmt = "g_{username}_{index}.{extension}"
     pattern = BASE_PATTERN + r"(?:/(?:gallery(?:/all|/?\?catpath=)?/?)?)?$"
     test = (
@@ -355,6 +356,7 @@ class DeviantartGalleryExtractor(DeviantartExtractor):
 class DeviantartFolderExtractor(DeviantartExtractor):
     """Extractor for deviations inside an artist's gallery folder"""
     subcategory = "folder"
+    date_field = "date"
     directory_fmt = ("{category}", "{folder[owner]}", "{folder[title]}")
     archive_fmt = "F_{folder[uuid]}_{index}.{extension}"
     pattern = BASE_PATTERN + r"/gallery/(\d+)/([^/?&#]+)"
@@ -1023,7 +1025,11 @@ class DeviantartAPI():
 
     def _pagination(self, endpoint, params, extend=True):
         public = True
+        if extend:
+            params = self.extractor.resume(endpoint) or params
         while True:
+            if extend:
+                self.extractor.checkpoint(params.copy(), endpoint)
             data = self._call(endpoint, params, public=public)
             if "results" not in data:
                 self.log.error("Unexpected API response: %s", data)
@@ -45,6 +45,11 @@ class FlickrExtractor(Extractor):
         self.user = self.api.urls_lookupUser(self.item_id)
         return {"user": self.user}
 
+    def skip(self, num):
+        pages = num // self.api.per_page
+        self.api.page_start += pages
+        return pages * self.api.per_page
+
     def photos(self):
         """Return an iterable with all relevant photo objects"""
 
@@ -96,6 +101,9 @@ class FlickrImageExtractor(FlickrExtractor):
                         "vwxyzABCDEFGHJKLMNPQRSTUVWXYZ")
             self.item_id = util.bdecode(match.group(2), alphabet)
 
+    def skip(self, _):
+        return 0
+
     def items(self):
         photo = self.api.photos_getInfo(self.item_id)
 
@@ -309,6 +317,8 @@ class FlickrAPI(oauth.OAuth1API):
     def __init__(self, extractor):
         oauth.OAuth1API.__init__(self, extractor)
 
+        self.per_page = 100
+        self.page_start = 1
         self.videos = extractor.config("videos", True)
         self.maxsize = extractor.config("size-max")
         if isinstance(self.maxsize, str):
@@ -436,9 +446,11 @@ class FlickrAPI(oauth.OAuth1API):
     def _pagination(self, method, params, key="photos"):
         params["extras"] = "description,date_upload,tags,views,media,"
         params["extras"] += ",".join("url_" + fmt[0] for fmt in self.formats)
-        params["page"] = 1
+        params["per_page"] = self.per_page
+        params["page"] = self.extractor.resume(method) or self.page_start
 
         while True:
+            self.extractor.checkpoint(params["page"], method)
             data = self._call(method, params)[key]
             yield from data["photo"]
             if params["page"] >= data["pages"]:
@@ -32,6 +32,10 @@ class GelbooruExtractor(booru.XmlParserMixin,
             self.items = self.items_noapi
             self.session.cookies["fringeBenefits"] = "yup"
 
+    def init_predicate(self, predicate):
+        # post pages get requested for all files without API access
+        return self.use_api and super().init_predicate(predicate)
+
     def items_noapi(self):
         yield Message.Version, 1
         data = self.get_metadata()
@@ -66,6 +70,7 @@ class GelbooruExtractor(booru.XmlParserMixin,
         ))[0]
         data["file_url"] = "http" + data["file_url"].replace("m//", "m/", 1)
         data["md5"] = data["file_url"].rpartition("/")[2].partition(".")[0]
+        data["_original"] = True
         data["rating"] = (data["rating"] or "?")[0].lower()
         data["tags"] = " ".join(
             [tag.replace(" ", "_") for tag in data["tags"].split(", ")])
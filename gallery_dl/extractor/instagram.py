@@ -391,6 +391,7 @@ class InstagramStoriesExtractor(InstagramExtractor):
 class InstagramUserExtractor(InstagramExtractor):
     """Extractor for ProfilePage"""
     subcategory = "user"
+    date_field = "date"
     pattern = (r"(?:https?://)?(?:www\.)?instagram\.com"
                r"/(?!p/|explore/|directory/|accounts/|stories/|tv/)"
                r"([^/?&#]+)/?$")
@@ -431,6 +432,7 @@ class InstagramUserExtractor(InstagramExtractor):
 class InstagramChannelExtractor(InstagramExtractor):
     """Extractor for ProfilePage channel"""
     subcategory = "channel"
+    date_field = "date"
     pattern = (r"(?:https?://)?(?:www\.)?instagram\.com"
                r"/(?!p/|explore/|directory/|accounts/|stories/|tv/)"
                r"([^/?&#]+)/channel")
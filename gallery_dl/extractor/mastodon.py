@@ -30,10 +30,9 @@ class MastodonExtractor(Extractor):
         value = Extractor.config(self, key, sentinel)
         if value is not sentinel:
             return value
-        return config.interpolate(
-            ("extractor", "mastodon", self.instance, self.subcategory, key),
-            default,
-        )
+        return config.snapshot(
+            ("extractor", "mastodon", self.instance, self.subcategory),
+        ).get(key, default)
 
     def items(self):
         yield Message.Version, 1
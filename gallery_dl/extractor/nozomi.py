@@ -9,7 +9,15 @@
 """Extractors for https://nozomi.la/"""
 
 from .common import Extractor, Message
-from .. import text
+from .. import text, util, config
+import itertools
+import operator
+import array
+import sys
+
+
+# typecode of a 4-byte unsigned integer array
+TYPECODE = "I" if array.array("I").itemsize == 4 else "L"
 
 
 class NozomiExtractor(Extractor):
@@ -26,18 +34,9 @@ class NozomiExtractor(Extractor):
         self.session.headers["Origin"] = self.root
         self.session.headers["Referer"] = self.root + "/"
 
-        for post_id in map(str, self.posts()):
-            url = "https://j.nozomi.la/post/{}/{}/{}.json".format(
-                post_id[-1], post_id[-3:-1], post_id)
-            response = self.request(url, fatal=False)
-
-            if response.status_code >= 400:
-                self.log.warning(
-                    "Skipping post %s ('%s %s')",
-                    post_id, response.status_code, response.reason)
+        for image in self._resolve(map(str, self.posts())):
+            if not image:
                 continue
-
-            image = response.json()
             image["tags"] = self._list(image.get("general"))
             image["artist"] = self._list(image.get("artist"))
             image["copyright"] = self._list(image.get("copyright"))
@@ -59,6 +58,37 @@ class NozomiExtractor(Extractor):
     def metadata(self):
         return {}
 
+    def _resolve(self, post_ids):
+        """Yield the JSON data of all 'post_ids' in order
+
+        Up to 'workers' threads request post data in parallel,
+        staying at most twice as many posts ahead of the caller.
+        """
+        workers = self.config("workers", 4)
+        if not workers or workers <= 1:
+            yield from map(self._post, post_ids)
+            return
+
+        with util.Lookahead(config.bind(self._post), workers) as posts:
+            for post_id in post_ids:
+                posts.submit(None, post_id)
+                if len(posts) >= workers * 2:
+                    yield posts.pop()[1]
+            while posts:
+                yield posts.pop()[1]
+
+    def _post(self, post_id):
+        url = "https://j.nozomi.la/post/{}/{}/{}.json".format(
+            post_id[-1], post_id[-3:-1], post_id)
+        response = self.request(url, fatal=False)
+
+        if response.status_code >= 400:
+            self.log.warning(
+                "Skipping post %s ('%s %s')",
+                post_id, response.status_code, response.reason)
+            return None
+        return response.json()
+
     def posts(self):
         return ()
 
@@ -70,8 +100,11 @@ class NozomiExtractor(Extractor):
 
     @staticmethod
     def _unpack(b):
-        for i in range(0, len(b), 4):
-            yield (b[i] << 24) + (b[i+1] << 16) + (b[i+2] << 8) + b[i+3]
+        """Decode a sequence of big-endian 32-bit post IDs"""
+        ids = array.array(TYPECODE, b[:len(b) & ~3])
+        if sys.byteorder == "little":
+            ids.byteswap()
+        return ids
 
 
 class NozomiPostExtractor(NozomiExtractor):
@@ -162,24 +195,73 @@ class NozomiSearchExtractor(NozomiExtractor):
         return {"search_tags": self.tags}
 
     def posts(self):
-        index = None
-        result = set()
+        positive = []
+        negative = []
 
         def nozomi(path):
             url = "https://j.nozomi.la/" + path + ".nozomi"
-            return self._unpack(self.request(url).content)
+            return _ascending(self._unpack(self.request(url).content))
 
         for tag in self.tags:
             if tag[0] == "-":
-                if not index:
-                    index = set(nozomi("index"))
-                items = index.difference(nozomi("nozomi/" + tag[1:]))
-            else:
-                items = nozomi("nozomi/" + tag)
-
-            if result:
-                result.intersection_update(items)
+                negative.append(nozomi("nozomi/" + tag[1:]))
             else:
-                result.update(items)
-
-        return result
+                positive.append(nozomi("nozomi/" + tag))
+
+        if positive:
+            # start with the smallest set of posts
+            positive.sort(key=len)
+            result = positive[0]
+            for items in positive[1:]:
+                result = _intersection(result, items)
+        else:
+            result = nozomi("index")
+        for items in negative:
+            result = _difference(result, items)
+
+        # newest posts first
+        return reversed(result)
+
+
+def _ascending(ids):
+    """Return the post IDs of a .nozomi file in ascending order"""
+    ids.reverse()
+    if any(map(operator.gt, ids, itertools.islice(ids, 1, None))):
+        ids = array.array(ids.typecode, sorted(ids))
+    return ids
+
+
+def _intersection(values, other):
+    """Return all elements of sorted array 'values' in sorted array 'other'"""
+    result = array.array(values.typecode)
+    append = result.append
+    other = iter(other)
+    try:
+        current = next(other)
+        for value in values:
+            while current < value:
+                current = next(other)
+            if current == value:
+                append(value)
+    except StopIteration:
+        pass
+    return result
+
+
+def _difference(values, other):
+    """Return all elements of sorted array 'values' not in sorted 'other'"""
+    result = array.array(values.typecode)
+    append = result.append
+    other = iter(other)
+    index = 0
+    try:
+        current = next(other)
+        for index, value in enumerate(values):
+            while current < value:
+                current = next(other)
+            if current != value:
+                append(value)
+    except StopIteration:
+        # no more elements to remove
+        result.extend(values[index:])
+    return result
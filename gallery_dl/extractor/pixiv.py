@@ -82,6 +82,7 @@ class PixivExtractor(Extractor):
 class PixivUserExtractor(PixivExtractor):
     """Extractor for works of a pixiv-user"""
     subcategory = "user"
+    watermark = "id"
     pattern = (r"(?:https?://)?(?:www\.|touch\.)?pixiv\.net/"
                r"(?:member(?:_illust)?\.php\?id=(\d+)(?:&([^#]+))?"
                r"|(?:u(?:ser)?/|(?:mypage\.php)?#id=)(\d+))")
@@ -17,6 +17,7 @@ import time
 class RedditExtractor(Extractor):
     """Base class for reddit extractors"""
     category = "reddit"
+    ordered = "chapter"
 
     def __init__(self, match):
         Extractor.__init__(self, match)
@@ -93,6 +94,8 @@ class RedditSubredditExtractor(RedditExtractor):
         RedditExtractor.__init__(self, match)
         self.subreddit = match.group(1)
         self.params = text.parse_query(match.group(2))
+        if self.subreddit.endswith("/new"):
+            self.watermark = self.date_field = "created_utc"
 
     def submissions(self):
         return self.api.submissions_subreddit(self.subreddit, self.params)
@@ -116,6 +119,9 @@ class RedditUserExtractor(RedditExtractor):
         RedditExtractor.__init__(self, match)
         self.user = match.group(1)
         self.params = text.parse_query(match.group(2))
+        if self.user.partition("/")[2] in ("", "overview", "submitted") \
+                and self.params.get("sort", "new") == "new":
+            self.watermark = self.date_field = "created_utc"
 
     def submissions(self):
         return self.api.submissions_user(self.user, self.params)
@@ -294,12 +300,17 @@ class RedditAPI():
         id_min = self._parse_id("id-min", 0)
         id_max = self._parse_id("id-max", 2147483647)
         date_min, date_max = self.extractor._get_date_min_max(0, 253402210800)
+        ordered = self.extractor.date_field
 
         while True:
             data = self._call(endpoint, params)["data"]
 
             for submission in data["children"]:
                 submission = submission["data"]
+                if ordered and submission["created_utc"] < date_min and \
+                        not submission.get("stickied") and \
+                        not submission.get("pinned"):
+                    return
                 if (date_min <= submission["created_utc"] <= date_max and
                         id_min <= self._decode(submission["id"]) <= id_max):
                     if submission["num_comments"] and self.comments:
@@ -94,6 +94,7 @@ class SankakuExtractor(SharedConfigMixin, Extractor):
             "created_at": created,
             "rating": (rating or "?")[0].lower(),
             "file_url": "https:" + text.unescape(file_url),
+            "_original": True,
             "width": text.parse_int(width),
             "height": text.parse_int(height),
         }
@@ -85,6 +85,11 @@ class SmugmugAlbumExtractor(SmugmugExtractor):
     def __init__(self, match):
         SmugmugExtractor.__init__(self, match)
         self.album_id = match.group(1)
+        self.offset = 0
+
+    def skip(self, num):
+        self.offset += num
+        return num
 
     def items(self):
         album = self.api.album(self.album_id, "User")
@@ -97,7 +102,8 @@ class SmugmugAlbumExtractor(SmugmugExtractor):
         yield Message.Version, 1
         yield Message.Directory, data
 
-        for image in self.api.album_images(self.album_id, "ImageSizeDetails"):
+        for image in self.api.album_images(
+                self.album_id, "ImageSizeDetails", self.offset):
             url = self._select_format(image)
             data["Image"] = image
             yield Message.Url, url, text.nameext_from_url(url, data)
@@ -227,8 +233,9 @@ class SmugmugAPI(oauth.OAuth1API):
     def user(self, username, expands=None):
         return self._expansion("user/" + username, expands)
 
-    def album_images(self, album_id, expands=None):
-        return self._pagination("album/" + album_id + "!images", expands)
+    def album_images(self, album_id, expands=None, offset=0):
+        return self._pagination(
+            "album/" + album_id + "!images", expands, offset)
 
     def node_children(self, node_id, expands=None):
         return self._pagination("node/" + node_id + "!children", expands)
@@ -272,9 +279,9 @@ class SmugmugAPI(oauth.OAuth1API):
             raise exception.NotFoundError()
         return result[0]
 
-    def _pagination(self, endpoint, expands=None):
+    def _pagination(self, endpoint, expands=None, offset=0):
         endpoint = self._extend(endpoint, expands)
-        params = {"start": 1, "count": 100}
+        params = {"start": offset + 1, "count": 100}
 
         while True:
             data = self._call(endpoint, params)
@@ -45,6 +45,7 @@ class TumblrExtractor(Extractor):
     directory_fmt = ("{category}", "{name}")
     filename_fmt = "{category}_{blog_name}_{id}_{num:>02}.{extension}"
     archive_fmt = "{id}_{num}"
+    timestamp_key = "timestamp"  # results are ordered by this, newest first
 
     def __init__(self, match):
         Extractor.__init__(self, match)
@@ -72,7 +73,7 @@ class TumblrExtractor(Extractor):
         yield Message.Version, 1
 
         for post in self.posts():
-            if self.date_min > post["timestamp"]:
+            if self.date_min > post[self.timestamp_key]:
                 return
             if post["type"] not in self.types:
                 continue
@@ -200,6 +201,8 @@ class TumblrExtractor(Extractor):
 class TumblrUserExtractor(TumblrExtractor):
     """Extractor for all images from a tumblr-user"""
     subcategory = "user"
+    watermark = "id"
+    date_field = "date"
     pattern = BASE_PATTERN + r"(?:/page/\d+|/archive)?/?$"
     test = (
         ("http://demo.tumblr.com/", {
@@ -302,6 +305,7 @@ class TumblrPostExtractor(TumblrExtractor):
 class TumblrTagExtractor(TumblrExtractor):
     """Extractor for images from a tumblr-user by tag"""
     subcategory = "tag"
+    date_field = "date"
     pattern = BASE_PATTERN + r"/tagged/([^/?&#]+)"
     test = ("http://demo.tumblr.com/tagged/Times%20Square", {
         "pattern": (r"https://\d+\.media\.tumblr\.com/tumblr_[^/_]+_1280.jpg"),
@@ -321,6 +325,7 @@ class TumblrLikesExtractor(TumblrExtractor):
     subcategory = "likes"
     directory_fmt = ("{category}", "{name}", "likes")
     archive_fmt = "f_{blog[name]}_{id}_{num}"
+    timestamp_key = "liked_timestamp"
     pattern = BASE_PATTERN + r"/likes"
     test = ("http://mikf123.tumblr.com/likes", {
         "count": 1,
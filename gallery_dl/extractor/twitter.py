@@ -30,6 +30,10 @@ class TwitterExtractor(Extractor):
         self.content = self.config("content", False)
         self.videos = self.config("videos", False)
 
+        if self.retweets:
+            # retweets break the ordering by 'tweet_id' and 'date'
+            self.watermark = self.date_field = None
+
         if self.content:
             self._emoji_sub = re.compile(
                 r'<img class="Emoji [^>]+ alt="([^"]+)"[^>]*>').sub
@@ -156,6 +160,8 @@ class TwitterExtractor(Extractor):
 class TwitterTimelineExtractor(TwitterExtractor):
     """Extractor for all images from a user's timeline"""
     subcategory = "timeline"
+    watermark = "tweet_id"
+    date_field = "date"
     pattern = (r"(?:https?://)?(?:www\.|mobile\.)?twitter\.com"
                r"/(?!search)([^/?&#]+)/?(?:$|[?#])")
     test = (
@@ -176,6 +182,8 @@ class TwitterTimelineExtractor(TwitterExtractor):
 class TwitterMediaExtractor(TwitterExtractor):
     """Extractor for all images from a user's Media Tweets"""
     subcategory = "media"
+    watermark = "tweet_id"
+    date_field = "date"
     pattern = (r"(?:https?://)?(?:www\.|mobile\.)?twitter\.com"
                r"/(?!search)([^/?&#]+)/media(?!\w)")
     test = (
@@ -7,16 +7,23 @@
 # published by the Free Software Foundation.
 
 import sys
+import copy
 import time
+import queue
 import logging
+import threading
+import collections
 from . import extractor, downloader, postprocessor
 from . import config, text, util, output, exception
 from .extractor.message import Message
+from .postprocessor.common import PostProcessor
 
 
 class Job():
     """Base class for Job-types"""
     ulog = None
+    checkpoints = False
+    failed = False
 
     def __init__(self, extr, parent=None):
         if isinstance(extr, str):
@@ -29,7 +36,15 @@ class Job():
         extr.log.job = self
         extr.log.debug("Using %s for '%s'", extr.__class__.__name__, extr.url)
 
+        self.pred_date = extr.date_predicate()
+        self.pred_watermark = None
+        if self.checkpoints:
+            extr.init_checkpoint()
+            self.pred_watermark = extr.init_watermark()
+
         self.pred_url = self._prepare_predicates("image", True)
+        if extr.init_predicate(self.pred_url):
+            self.pred_url = util.build_predicate(())
         self.pred_queue = self._prepare_predicates("chapter", False)
 
         if parent and parent.extractor.config(
@@ -42,10 +57,12 @@ class Job():
 
     def run(self):
         """Execute or run the job"""
+        stopped = None
         try:
             log = self.extractor.log
             for msg in self.extractor:
                 self.dispatch(msg)
+            stopped = False
         except exception.AuthenticationError as exc:
             msg = str(exc) or "Please provide a valid username/password pair."
             log.error("Authentication failed: %s", msg)
@@ -69,7 +86,7 @@ class Job():
             log.error("Evaluating filter expression failed:  %s: %s",
                       err.__class__.__name__, err)
         except exception.StopExtraction:
-            pass
+            stopped = True
         except OSError as exc:
             log.error("Unable to download data:  %s: %s",
                       exc.__class__.__name__, exc)
@@ -83,11 +100,16 @@ class Job():
             log.debug("", exc_info=True)
         finally:
             self.handle_finalize()
+        if stopped is None:
+            self.failed = True
+        else:
+            self.extractor.complete(stopped)
 
     def dispatch(self, msg):
         """Call the appropriate message handler"""
         if msg[0] == Message.Url:
             _, url, kwds = msg
+            self.extractor.position += 1
             if self.pred_url(url, kwds):
                 self.update_kwdict(kwds)
                 self.handle_url(url, kwds)
@@ -103,6 +125,7 @@ class Job():
 
         elif msg[0] == Message.Urllist:
             _, urls, kwds = msg
+            self.extractor.position += 1
             if self.pred_url(urls[0], kwds):
                 self.update_kwdict(kwds)
                 self.handle_urllist(urls, kwds)
@@ -140,6 +163,13 @@ class Job():
     def _prepare_predicates(self, target, skip=True):
         predicates = []
 
+        if target == self.extractor.ordered:
+            # results in order of date or ID, newest first
+            if self.pred_date:
+                predicates.append(self.pred_date)
+            if self.pred_watermark:
+                predicates.append(self.pred_watermark)
+
         if self.extractor.config(target + "-unique"):
             predicates.append(util.UniquePredicate())
 
@@ -160,8 +190,11 @@ class Job():
                 self.extractor.log.warning(
                     "invalid %s range: %s", target, exc)
             else:
-                if skip and pred.lower > 1 and not pfilter:
-                    pred.index += self.extractor.skip(pred.lower - 1)
+                if skip and self.extractor.position and not pfilter:
+                    # resuming from a checkpoint
+                    pred.index += self.extractor.position
+                elif skip and pred.lower > 1 and not pfilter:
+                    pred.index += self.extractor.skip(pred.next_index() - 1)
                 predicates.append(pred)
 
         return util.build_predicate(predicates)
@@ -178,6 +211,7 @@ class Job():
 
 class DownloadJob(Job):
     """Download images into appropriate directory/filename locations"""
+    checkpoints = True
 
     def __init__(self, url, parent=None):
         Job.__init__(self, url, parent)
@@ -187,6 +221,11 @@ class DownloadJob(Job):
         self.sleep = None
         self.downloaders = {}
         self.postprocessors = None
+        self.steps = None
+        self.background = None
+        self._background_thread = None
+        self.archived = collections.deque()
+        self.deferred = collections.deque()
         self.out = output.select()
 
     def handle_url(self, url, keywords, fallback=None):
@@ -196,51 +235,148 @@ class DownloadJob(Job):
         archive = self.archive
 
         # prepare download
+        if self.deferred:
+            self._run_deferred(self.deferred)
+        if self.archived:
+            self._add_archived()
         pathfmt.set_filename(keywords)
 
         if postprocessors:
             for pp in postprocessors:
                 pp.prepare(pathfmt)
 
-        if pathfmt.exists(archive):
+        if pathfmt.linked and not (archive and keywords in archive):
+            # a postprocessor provided this file, e.g. by linking it to an
+            # identical one, and it gets handled like a completed download
+            pass
+
+        elif pathfmt.exists(archive):
+            if self.pred_watermark:
+                self.pred_watermark.record(keywords)
             self.handle_skip()
             return
 
-        if self.sleep:
-            time.sleep(self.sleep)
+        else:
+            if self.sleep:
+                time.sleep(self.sleep)
 
-        # download from URL
-        if not self.download(url):
+            # download from URL
+            if not self.download(url):
 
-            # use fallback URLs if available
-            for num, url in enumerate(fallback or (), 1):
-                self.log.info("Trying fallback URL #%d", num)
-                if self.download(url):
-                    break
-            else:
-                # download failed
-                self.log.error("Failed to download %s",
-                               pathfmt.filename or url)
-                return
+                # use fallback URLs if available
+                for num, url in enumerate(fallback or (), 1):
+                    self.log.info("Trying fallback URL #%d", num)
+                    if self.download(url):
+                        break
+                else:
+                    # download failed
+                    self.log.error("Failed to download %s",
+                                   pathfmt.filename or url)
+                    self._fail()
+                    return
+
+        if self.pred_watermark:
+            self.pred_watermark.record(keywords)
 
         if not pathfmt.temppath:
             self.handle_skip()
             return
 
-        # run post processors
-        if postprocessors:
-            for pp in postprocessors:
-                pp.run(pathfmt)
+        if self.background:
+            # continue with copies unaffected by the next download
+            pathfmt = copy.copy(pathfmt)
+            pathfmt.kwdict = pathfmt.kwdict.copy()
 
-        # download succeeded
+        # run post processors and move file to its target location
+        self._run_steps(pathfmt, self.steps, self.deferred,
+                        self.background.put if self.background else None)
+        self._skipcnt = 0
+
+    def _finalize(self, pathfmt):
+        """Move the downloaded file to its target location"""
         pathfmt.finalize()
         self.out.success(pathfmt.path, 0)
-        if archive:
-            archive.add(keywords)
-        if postprocessors:
-            for pp in postprocessors:
-                pp.run_after(pathfmt)
-        self._skipcnt = 0
+        if self.archive:
+            self.archive.add(pathfmt.kwdict)
+
+    def _finalize_background(self, pathfmt):
+        pathfmt.finalize()
+        self.out.success(pathfmt.path, 0)
+        if self.archive:
+            # the archive's database connection is bound to the main thread
+            self.archived.append(pathfmt.kwdict)
+
+    def _run_steps(self, pathfmt, steps, deferred, done=None):
+        """Run 'steps' for 'pathfmt' and call 'done' afterwards
+
+        A step can set 'pathfmt.deferred' to a Future for work it
+        continues in the background. All remaining steps then get put
+        on hold until _run_deferred() finds its result to be true.
+        """
+        for index, step in enumerate(steps):
+            step(pathfmt)
+            future = pathfmt.deferred
+            if future:
+                pathfmt.deferred = None
+                pathfmt = copy.copy(pathfmt)
+                pathfmt.kwdict = pathfmt.kwdict.copy()
+                deferred.append((future, pathfmt, steps[index+1:], done))
+                return
+        if done:
+            done(pathfmt)
+
+    def _run_deferred(self, deferred, wait=False):
+        """Continue processing files whose deferred work has finished"""
+        while deferred:
+            future, pathfmt, steps, done = deferred[0]
+            if not wait and not future.done():
+                return
+            deferred.popleft()
+            if future.result():
+                self._run_steps(pathfmt, steps, deferred, done)
+            else:
+                self.log.error("Post-processing '%s' failed", pathfmt.path)
+                self._fail()
+
+    def _run_background(self, steps):
+        """Process the background steps of each queued file"""
+        deferred = collections.deque()
+        while True:
+            pathfmt = self.background.get()
+            if pathfmt is None:
+                break
+            try:
+                self._run_steps(pathfmt, steps, deferred)
+                self._run_deferred(deferred)
+            except Exception as exc:
+                self._error_pp(pathfmt, exc)
+        self._finish_deferred(deferred)
+
+    def _finish_deferred(self, deferred):
+        """Wait for all deferred work and run the remaining steps"""
+        while deferred:
+            pathfmt = deferred[0][1]
+            try:
+                self._run_deferred(deferred, True)
+            except Exception as exc:
+                self._error_pp(pathfmt, exc)
+
+    def _fail(self):
+        """Mark this job as not having handled all of its files"""
+        self.failed = True
+        if self.pred_watermark:
+            self.pred_watermark.failed = True
+
+    def _error_pp(self, pathfmt, exc):
+        self._fail()
+        self.log.error("Post-processing '%s' failed: %s: %s",
+                       pathfmt.path, exc.__class__.__name__, exc)
+        self.log.debug("", exc_info=True)
+
+    def _add_archived(self):
+        archived = self.archived
+        while archived:
+            self.archive.add(archived.popleft())
 
     def handle_urllist(self, urls, keywords):
         """Download the resource specified in 'url'"""
@@ -261,15 +397,29 @@ class DownloadJob(Job):
         else:
             extr = extractor.find(url)
         if extr:
-            self.__class__(extr, self).run()
+            job = self.__class__(extr, self)
+            job.run()
+            if job.failed:
+                self._fail()
+                return
         else:
             self._write_unsupported(url)
+        if self.pred_watermark:
+            self.pred_watermark.record(keywords)
 
     def handle_finalize(self):
+        if self.deferred:
+            self._finish_deferred(self.deferred)
+        if self.background:
+            self.background.put(None)
+            self._background_thread.join()
+            self.background = None
         if self.postprocessors:
             for pp in self.postprocessors:
                 pp.finalize()
         if self.archive:
+            if self.archived:
+                self._add_archived()
             self.archive.close()
         if self.pathfmt:
             self.extractor._store_cookies()
@@ -348,9 +498,11 @@ class DownloadJob(Job):
             else:
                 self.extractor.log.debug("Using download archive '%s'", path)
 
+        self.steps = [self._finalize]
         postprocessors = self.extractor.config("postprocessors")
         if postprocessors:
             pp_list = []
+            background = []
 
             for pp_dict in postprocessors:
                 whitelist = pp_dict.get("whitelist")
@@ -371,15 +523,58 @@ class DownloadJob(Job):
                         name, exc.__class__.__name__, exc)
                 else:
                     pp_list.append(pp_obj)
+                    background.append(pp_dict.get("background", False))
 
             if pp_list:
                 self.postprocessors = pp_list
                 self.extractor.log.debug(
                     "Active postprocessor modules: %s", pp_list)
+                self._init_steps(pp_list, background)
+
+    def _init_steps(self, postprocessors, background):
+        """Split post-download actions into foreground and background steps
+
+        All actions starting with the first one implemented by a
+        'background' postprocessor get run in a separate thread, in order
+        and for one file after another.
+        """
+        actions = [(pp, "run", bg)
+                   for pp, bg in zip(postprocessors, background)]
+        actions.append((None, None, False))
+        actions.extend((pp, "run_after", bg)
+                       for pp, bg in zip(postprocessors, background))
+
+        steps = []
+        split = None
+        for index, (pp, name, bg) in enumerate(actions):
+            if not pp:
+                steps.append(self._finalize)
+                continue
+            if bg and split is None and getattr(pp.__class__, name) is not \
+                    getattr(PostProcessor, name):
+                split = index
+            steps.append(getattr(pp, name))
+
+        if split is not None:
+            bgsteps = [
+                self._finalize_background if step == self._finalize else step
+                for step in steps[split:]
+            ]
+            maxsize = max(8 if bg is True else bg for bg in background)
+            self.background = queue.Queue(maxsize)
+            self._background_thread = threading.Thread(
+                target=config.bind(self._run_background),
+                args=(bgsteps,), daemon=True,
+            )
+            self._background_thread.start()
+            del steps[split:]
+
+        self.steps = steps
 
 
 class SimulationJob(DownloadJob):
     """Simulate the extraction process without downloading anything"""
+    checkpoints = False
 
     def handle_url(self, url, keywords, fallback=None):
         self.pathfmt.set_filename(keywords)
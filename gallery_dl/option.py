@@ -113,8 +113,20 @@ def build_parser():
     )
     general.add_argument(
         "--clear-cache",
-        dest="clear_cache", action="store_true",
-        help="Delete all cached login sessions, cookies, etc.",
+        dest="clear_cache", metavar="MODULE", nargs="?", const=True,
+        help=("Delete all cached login sessions, cookies, etc. "
+              "or only those of MODULE"),
+    )
+    general.add_argument(
+        "--cache-stats",
+        dest="cache_stats", action="store_true",
+        help="Print the number, size, and usage of cache entries",
+    )
+    general.add_argument(
+        "--catalog",
+        dest="catalog", metavar="QUERY",
+        help=("Print the paths of all files in the download catalog "
+              "matching QUERY ('KEY:VALUE' terms and tags)"),
     )
 
     output = parser.add_argument_group("Output Options")
@@ -193,6 +205,12 @@ def build_parser():
               "been skipped, e.g. if files with the same filename already "
               "exist"),
     )
+    downloader.add_argument(
+        "--resume",
+        dest="resume", nargs=0, action=ConfigConstAction, const=True,
+        help=("Continue an interrupted extractor run from its last "
+              "checkpoint instead of from the beginning"),
+    )
     downloader.add_argument(
         "--http-timeout",
         dest="timeout", metavar="SECONDS", type=float, action=ConfigAction,
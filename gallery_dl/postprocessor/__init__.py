@@ -12,7 +12,9 @@ import importlib
 import logging
 
 modules = [
+    "catalog",
     "classify",
+    "dedup",
     "exec",
     "metadata",
     "mtime",
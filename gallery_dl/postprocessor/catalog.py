@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2019 Mike Fährmann
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation.
+
+"""Record downloaded files in an SQLite database"""
+
+from .common import PostProcessor, open_database
+from .. import config, util
+import shlex
+import time
+import json
+import os
+
+
+class CatalogPP(PostProcessor):
+
+    DEFAULT_FIELDS = ("category", "subcategory", "id", "md5")
+    BATCH_TIME = 10
+
+    def __init__(self, pathfmt, options):
+        PostProcessor.__init__(self)
+        self.fields = list(options.get("fields", self.DEFAULT_FIELDS))
+        indexes = options.get("indexes", self.fields)
+        self.tags = options.get("tags", "tags")
+        self.metadata = options.get("metadata", True)
+        self.batch_size = options.get("batch-size", 100)
+        self.batch_start = 0
+        self.rows = []
+
+        path = options.get("database")
+        self.db = connect(util.expand_path(path) if path else None)
+        self.cursor = cursor = self.db.cursor()
+
+        # add missing columns and indexes
+        cursor.execute("BEGIN")
+        columns = {row[1] for row in cursor.execute(
+            "PRAGMA table_info(files)")}
+        for field in self.fields:
+            name = _quote(field)
+            if field not in columns:
+                cursor.execute(
+                    "ALTER TABLE files ADD COLUMN {} TEXT".format(name))
+            if field in indexes:
+                cursor.execute(
+                    "CREATE INDEX IF NOT EXISTS {} ON files ({})".format(
+                        _quote("files_" + field), name))
+        cursor.execute("COMMIT")
+
+        self.insert = "INSERT OR REPLACE INTO files (path, metadata{}) " \
+                      "VALUES (?, ?{})".format(
+                          "".join(", " + _quote(f) for f in self.fields),
+                          ", ?" * len(self.fields))
+
+    def run_after(self, pathfmt):
+        kwdict = pathfmt.kwdict
+
+        metadata = json.dumps(
+            {k: v for k, v in kwdict.items() if k[0] != "_"},
+            default=str, sort_keys=True, ensure_ascii=False,
+        ) if self.metadata else None
+        values = [pathfmt.realpath, metadata] + [
+            _value(kwdict.get(field)) for field in self.fields]
+
+        tags = _tags(kwdict.get(self.tags)) if self.tags else None
+
+        # collect entries in memory and write them all at once,
+        # to not hold the database's write lock during downloads
+        if not self.rows:
+            self.batch_start = time.time()
+        self.rows.append((values, tags))
+        if len(self.rows) >= self.batch_size or \
+                time.time() - self.batch_start >= self.BATCH_TIME:
+            self._write()
+
+    def finalize(self):
+        try:
+            self._write()
+        finally:
+            self.db.close()
+
+    def _write(self):
+        """Store all collected entries in a single transaction"""
+        rows = self.rows
+        if not rows:
+            return
+        self.rows = []
+        cursor = self.cursor
+
+        cursor.execute("BEGIN")
+        try:
+            for values, tags in rows:
+                if self.tags:
+                    # 'INSERT OR REPLACE' assigns a new rowid
+                    cursor.execute(
+                        "DELETE FROM file_tags WHERE file IN "
+                        "(SELECT rowid FROM files WHERE path=?)",
+                        (values[0],))
+                cursor.execute(self.insert, values)
+                if tags:
+                    rowid = cursor.lastrowid
+                    cursor.executemany(
+                        "INSERT OR IGNORE INTO file_tags VALUES (?, ?)",
+                        [(rowid, tag) for tag in tags])
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+        cursor.execute("COMMIT")
+
+
+def connect(path=None):
+    """Open the catalog database and create its tables if necessary"""
+    if not path:
+        path = _path()
+    db = open_database(path)
+    cursor = db.cursor()
+    cursor.execute("CREATE TABLE IF NOT EXISTS files "
+                   "(path TEXT PRIMARY KEY, metadata TEXT)")
+    cursor.execute("CREATE TABLE IF NOT EXISTS file_tags "
+                   "(file INTEGER, tag TEXT, PRIMARY KEY (tag, file)) "
+                   "WITHOUT ROWID")
+    cursor.execute("CREATE INDEX IF NOT EXISTS file_tags_file "
+                   "ON file_tags (file)")
+    return db
+
+
+def query(expr, path=None):
+    """Return the paths of all files matching 'expr'
+
+    'expr' consists of whitespace-separated terms.
+    'KEY:VALUE' terms compare the field named KEY against VALUE,
+    all other terms have to be exactly equal to one of a file's tags.
+    'tag:VALUE' searches for tags containing a colon.
+    """
+    db = connect(path)
+    try:
+        cursor = db.cursor()
+        columns = {row[1] for row in cursor.execute(
+            "PRAGMA table_info(files)")}
+
+        conditions = []
+        params = []
+        tags = []
+        for term in shlex.split(expr):
+            key, sep, value = term.partition(":")
+            if not sep or not key.isidentifier():
+                tags.append(term)
+            elif key == "tag":
+                tags.append(value)
+            elif key in columns:
+                conditions.append(_quote(key) + " = ?")
+                params.append(value)
+            else:
+                conditions.append(
+                    "CAST(json_extract(metadata, ?) AS TEXT) = ?")
+                params.append("$." + key)
+                params.append(value)
+
+        for tag in tags:
+            conditions.append(
+                "rowid IN (SELECT file FROM file_tags WHERE tag = ?)")
+            params.append(tag)
+
+        stmt = "SELECT path FROM files"
+        if conditions:
+            stmt += " WHERE " + " AND ".join(conditions)
+        return [row[0] for row in cursor.execute(stmt + " ORDER BY path",
+                                                 params)]
+    finally:
+        db.close()
+
+
+def _path():
+    path = config.get(("catalog", "file"))
+    if path:
+        return util.expand_path(path)
+
+    if os.name == "nt":
+        return util.expand_path(
+            r"%USERPROFILE%\gallery-dl\catalog.sqlite3")
+    return util.expand_path(os.path.join(
+        os.environ.get("XDG_DATA_HOME", "~/.local/share"),
+        "gallery-dl", "catalog.sqlite3"))
+
+
+def _tags(tags):
+    """Return a list of all tags in a string or list"""
+    if not tags:
+        return None
+    if isinstance(tags, (list, tuple)):
+        return [str(tag) for tag in tags]
+    return str(tags).split()
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _value(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (list, tuple, dict)):
+        return json.dumps(value, default=str, sort_keys=True)
+    return str(value)
+
+
+__postprocessor__ = CatalogPP
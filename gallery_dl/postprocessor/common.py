@@ -9,6 +9,8 @@
 """Common classes and constants used by postprocessor modules."""
 
 import logging
+import sqlite3
+import os
 
 
 class PostProcessor():
@@ -36,3 +38,14 @@ class PostProcessor():
 
     def __repr__(self):
         return self.__class__.__name__
+
+
+def open_database(path):
+    """Open an SQLite database in autocommit mode for a postprocessor
+
+    Its connection gets used by at most one thread at a time,
+    but postprocessors might get run in a background thread.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    return sqlite3.connect(
+        path, timeout=30, isolation_level=None, check_same_thread=False)
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2019 Mike Fährmann
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation.
+
+"""Store identical files only once"""
+
+from .common import PostProcessor, open_database
+from .. import util
+import hashlib
+import shutil
+import os
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+FICLONE = 0x40049409
+
+
+class DedupPP(PostProcessor):
+
+    def __init__(self, pathfmt, options):
+        PostProcessor.__init__(self)
+        self.hash = options.get("hash", "sha256")
+        hashlib.new(self.hash)
+
+        directory = options.get("directory")
+        self.directory = util.expand_path(directory) if directory else \
+            os.path.join(pathfmt.basedirectory, ".objects")
+        os.makedirs(self.directory, exist_ok=True)
+
+        self.lookup = options.get("lookup", True)
+
+        mode = options.get("link", "hardlink")
+        if mode == "symlink":
+            self._store = self._store_move
+            self._link = os.symlink
+        elif mode == "reflink":
+            self._store = self._link = self._reflink
+        else:
+            self._store = self._link = self._hardlink
+
+        self.db = open_database(
+            os.path.join(self.directory, "index.sqlite3"))
+        self.db.execute("CREATE TABLE IF NOT EXISTS objects ("
+                        "algorithm TEXT, digest TEXT, object TEXT, "
+                        "PRIMARY KEY (algorithm, digest)) WITHOUT ROWID")
+
+    def prepare(self, pathfmt):
+        if not self.lookup:
+            return
+        path = pathfmt.realpath
+        if os.path.lexists(path):
+            return
+
+        # look for an already stored object with a checksum
+        # provided by the extractor, e.g. 'md5' on booru sites,
+        # as long as it is the checksum of the file getting downloaded
+        kwdict = pathfmt.kwdict
+        if not kwdict.get("_original"):
+            return
+        for algorithm in hashlib.algorithms_guaranteed:
+            digest = _digest(algorithm, kwdict.get(algorithm))
+            if not digest:
+                continue
+            row = self.db.execute(
+                "SELECT object FROM objects WHERE algorithm=? AND digest=?",
+                (algorithm, digest)).fetchone()
+            if row and os.path.exists(row[0]):
+                try:
+                    self._link(row[0], path)
+                except OSError as exc:
+                    self.log.warning("Unable to link '%s' (%s: %s)",
+                                     path, exc.__class__.__name__, exc)
+                else:
+                    # the file exists now and replaces its download
+                    self.log.debug("Using '%s' for '%s'", row[0], path)
+                    pathfmt.linked = True
+                return
+
+    def run_after(self, pathfmt):
+        path = pathfmt.realpath
+        if not os.path.isfile(path) or os.path.islink(path):
+            return
+        # only trust known checksums if no other postprocessor
+        # replaced the downloaded file, e.g. ugoira
+        digests = _digests(pathfmt.kwdict, path)
+        digest = digests.get(self.hash) or self._hash_file(path)
+        obj = os.path.join(self.directory, digest[:2], digest)
+
+        try:
+            if not os.path.exists(obj):
+                os.makedirs(os.path.dirname(obj), exist_ok=True)
+                self._store(path, obj)
+            elif not os.path.samefile(obj, path):
+                # replace 'path' with a link to the stored object
+                temppath = path + ".dedup"
+                self._link(obj, temppath)
+                os.replace(temppath, path)
+                self.log.debug("'%s' is a duplicate of '%s'", path, obj)
+        except OSError as exc:
+            self.log.warning("Unable to deduplicate '%s' (%s: %s)",
+                             path, exc.__class__.__name__, exc)
+            return
+
+        # remember all known checksums of this file
+        entries = [(self.hash, digest, obj)]
+        for algorithm, value in digests.items():
+            if algorithm != self.hash:
+                entries.append((algorithm, value, obj))
+        self.db.executemany(
+            "INSERT OR REPLACE INTO objects VALUES (?, ?, ?)", entries)
+
+    def finalize(self):
+        self.db.close()
+
+    def _hash_file(self, path):
+        digest = hashlib.new(self.hash)
+        with open(path, "rb") as file:
+            for data in iter(lambda: file.read(65536), b""):
+                digest.update(data)
+        return digest.hexdigest()
+
+    def _store_move(self, path, obj):
+        """Move 'path' into the object store and link it back"""
+        os.replace(path, obj)
+        os.symlink(obj, path)
+
+    @staticmethod
+    def _hardlink(src, dst):
+        try:
+            os.link(src, dst)
+        except OSError:
+            # different filesystem or too many links
+            shutil.copyfile(src, dst)
+
+    @staticmethod
+    def _reflink(src, dst):
+        if fcntl:
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                try:
+                    fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                    return
+                except OSError:
+                    pass
+        shutil.copyfile(src, dst)
+
+
+def _digests(kwdict, path):
+    """Return all known checksums of the downloaded file at 'path'"""
+    download = kwdict.get("_download")
+    if not download or download[0] != path:
+        return {}
+
+    digests = {}
+    if kwdict.get("_original"):
+        # checksums provided by the extractor
+        for algorithm in hashlib.algorithms_guaranteed:
+            value = _digest(algorithm, kwdict.get(algorithm))
+            if value:
+                digests[algorithm] = value
+    # checksums computed while downloading
+    digests.update(download[1])
+    return digests
+
+
+def _digest(algorithm, value):
+    """Return 'value' if it is a valid hex digest for 'algorithm'"""
+    if not value or not isinstance(value, str):
+        return None
+    value = value.lower()
+    if len(value) != hashlib.new(algorithm).digest_size * 2:
+        return None
+    try:
+        int(value, 16)
+    except ValueError:
+        return None
+    return value
+
+
+__postprocessor__ = DedupPP
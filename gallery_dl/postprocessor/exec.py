@@ -35,15 +35,73 @@ class ExecPP(PostProcessor):
             self._format = self._format_args_string
         else:
             self.args = [util.Formatter(arg) for arg in args]
+            # arguments repeated for each file in batch mode
+            self.args_file = [
+                "{_path" in arg or "{_filename" in arg for arg in args]
             self.shell = False
             self._format = self._format_args_list
 
-        if options.get("async", False):
+        self.batch = []
+        batch = options.get("batch")
+        if batch:
+            # collect files and run the command once for each
+            # 'batch' files or for each target directory
+            self.run_after = self._run_batch
+            self.batch_size = batch \
+                if isinstance(batch, int) and batch is not True else 0
+            self.batch_directory = None
+
+        self.processes = []
+        processes = options.get("async", False)
+        if processes:
             self._exec = self._exec_async
+            self.max_processes = processes if processes is not True \
+                else (os.cpu_count() or 1)
 
     def run_after(self, pathfmt):
         self._exec(self._format(pathfmt))
 
+    def _run_batch(self, pathfmt):
+        if pathfmt.realdirectory != self.batch_directory:
+            self._flush()
+            self.batch_directory = pathfmt.realdirectory
+
+        kwdict = pathfmt.kwdict.copy()
+        kwdict["_directory"] = pathfmt.realdirectory
+        kwdict["_filename"] = pathfmt.filename
+        kwdict["_path"] = pathfmt.realpath
+        self.batch.append(kwdict)
+
+        if len(self.batch) == self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        """Run the command for all files in the current batch"""
+        batch = self.batch
+        if not batch:
+            return
+        self.batch = []
+
+        if self.shell:
+            args = self.args.replace("{}", " ".join(
+                quote(kwdict["_path"]) for kwdict in batch))
+        else:
+            args = []
+            for arg, per_file in zip(self.args, self.args_file):
+                if per_file:
+                    args.extend(arg.format_map(kwdict) for kwdict in batch)
+                else:
+                    args.append(arg.format_map(batch[0]))
+            if not any(self.args_file):
+                args.extend(kwdict["_path"] for kwdict in batch)
+        self._exec(args)
+
+    def finalize(self):
+        self._flush()
+        for process in self.processes:
+            self._wait(process)
+        self.processes = []
+
     def _format_args_string(self, pathfmt):
         return self.args.replace("{}", quote(pathfmt.realpath))
 
@@ -56,14 +114,31 @@ class ExecPP(PostProcessor):
 
     def _exec(self, args):
         self.log.debug("Running '%s'", args)
-        retcode = subprocess.Popen(args, shell=self.shell).wait()
+        self._wait(subprocess.Popen(args, shell=self.shell))
+
+    def _exec_async(self, args):
+        # reap finished processes and wait for the oldest one
+        # if there are too many running at the same time
+        processes = []
+        for process in self.processes:
+            if process.poll() is None:
+                processes.append(process)
+            else:
+                self._wait(process)
+        while len(processes) >= self.max_processes:
+            self._wait(processes.pop(0))
+        self.processes = processes
+
+        self.log.debug("Running '%s'", args)
+        processes.append(subprocess.Popen(args, shell=self.shell))
+
+    def _wait(self, process):
+        retcode = process.wait()
         if retcode:
+            args = process.args
             self.log.warning(
                 "Executing '%s' returned with non-zero exit status (%d)",
                 " ".join(args) if isinstance(args, list) else args, retcode)
 
-    def _exec_async(self, args):
-        subprocess.Popen(args, shell=self.shell)
-
 
 __postprocessor__ = ExecPP
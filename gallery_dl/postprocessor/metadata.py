@@ -10,6 +10,9 @@
 
 from .common import PostProcessor
 from .. import util
+import json
+import gzip
+import os
 
 
 class MetadataPP(PostProcessor):
@@ -19,12 +22,18 @@ class MetadataPP(PostProcessor):
 
         mode = options.get("mode", "json")
         ext = "txt"
+        self.file = None
 
         if mode == "custom":
             self.write = self._write_custom
             self.formatter = util.Formatter(options.get("format"))
         elif mode == "tags":
             self.write = self._write_tags
+        elif mode == "jsonl":
+            self.run = self._run_jsonl
+            self.ascii = options.get("ascii", False)
+            self.path = util.expand_path(
+                options.get("file", "metadata.jsonl"))
         else:
             self.write = self._write_json
             self.indent = options.get("indent", 4)
@@ -38,6 +47,28 @@ class MetadataPP(PostProcessor):
         with open(path, "w", encoding="utf-8") as file:
             self.write(file, pathfmt.kwdict)
 
+    def _run_jsonl(self, pathfmt):
+        path = os.path.join(pathfmt.realdirectory, self.path)
+        if not self.file or self.file.name != path:
+            # one file per target directory, unless 'path' is absolute
+            self.finalize()
+            if path.endswith(".gz"):
+                self.file = gzip.open(path, "at", encoding="utf-8")
+            else:
+                self.file = open(path, "a", encoding="utf-8")
+
+        kwdict = pathfmt.kwdict.copy()
+        kwdict["_path"] = pathfmt.realpath
+        self.file.write(json.dumps(
+            kwdict, ensure_ascii=self.ascii, default=str, sort_keys=True,
+            separators=(",", ":"),
+        ) + "\n")
+
+    def finalize(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
     def _write_custom(self, file, kwdict):
         output = self.formatter.format_map(kwdict)
         file.write(output)
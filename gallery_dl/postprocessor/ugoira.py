@@ -11,13 +11,20 @@
 from .common import PostProcessor
 from .. import util
 import collections
+import concurrent.futures
 import subprocess
+import threading
 import tempfile
 import zipfile
+import hashlib
+import shutil
+import struct
 import os
 
 
 class UgoiraPP(PostProcessor):
+    _pool_executor = None
+    _pool_lock = threading.Lock()
 
     def __init__(self, pathfmt, options):
         PostProcessor.__init__(self)
@@ -26,6 +33,15 @@ class UgoiraPP(PostProcessor):
         self.twopass = options.get("ffmpeg-twopass", False)
         self.output = options.get("ffmpeg-output", True)
         self.delete = not options.get("keep-files", False)
+        self.stream = options.get("stream", False)
+
+        cache = options.get("cache")
+        self.cache = util.expand_path(cache) if cache else None
+
+        workers = options.get("workers", 1)
+        self.pool = self._pool(workers) \
+            if workers is True or workers != 1 else None
+        self.futures = []
 
         ffmpeg = options.get("ffmpeg-location")
         self.ffmpeg = util.expand_path(ffmpeg) if ffmpeg else "ffmpeg"
@@ -50,48 +66,138 @@ class UgoiraPP(PostProcessor):
             self.prevent_odd = False
 
     def prepare(self, pathfmt):
-        self._frames = None
+        if pathfmt.extension == "zip" and self._frames(pathfmt.kwdict):
+            pathfmt.kwdict["_ugoira"] = True
+            if self.delete:
+                pathfmt.set_extension(self.extension)
+        elif "_ugoira" in pathfmt.kwdict:
+            del pathfmt.kwdict["_ugoira"]
 
-        if pathfmt.extension != "zip":
+    def run(self, pathfmt):
+        # 'prepare' and 'run' might get called for different files
+        # in between when running in the background,
+        # so don't keep any per-file state in 'self'
+        if not pathfmt.kwdict.get("_ugoira"):
             return
+        frames = self._frames(pathfmt.kwdict)
 
-        if "frames" in pathfmt.kwdict:
-            self._frames = pathfmt.kwdict["frames"]
-        elif "pixiv_ugoira_frame_data" in pathfmt.kwdict:
-            self._frames = pathfmt.kwdict["pixiv_ugoira_frame_data"]["data"]
+        zippath = pathfmt.temppath
+        pathfmt.set_extension("zip")
+        ziprealpath = pathfmt.realpath
+        pathfmt.set_extension(self.extension)
+        outpath = pathfmt.realpath
+
+        if self.cache:
+            key = self._cache_key(zippath, frames)
+            if self._cache_load(key, outpath):
+                self.log.debug("Using cached conversion '%s'", key)
+                if self.delete:
+                    pathfmt.delete = True
+                else:
+                    pathfmt.set_extension("zip")
+                return
         else:
+            key = None
+
+        if self.pool:
+            # hand the ZIP archive over to a worker thread;
+            # it gets deleted or moved to its target location from there
+            # and all remaining steps for this file wait for its result
+            pathfmt.temppath = pathfmt.realpath
+            pathfmt.deferred = future = self.pool.submit(
+                self._convert_task, zippath, ziprealpath, outpath,
+                frames, key)
+            self.futures = [f for f in self.futures if not f.done()]
+            self.futures.append(future)
             return
 
-        if self.delete:
-            pathfmt.set_extension(self.extension)
+        try:
+            retcode = self._convert(zippath, outpath, frames)
+        except OSError as exc:
+            print()
+            self._error(exc)
+            pathfmt.realpath = pathfmt.temppath
+        else:
+            if key and retcode == 0:
+                self._cache_store(key, outpath)
+            if self.delete:
+                pathfmt.delete = True
+            else:
+                pathfmt.set_extension("zip")
 
-    def run(self, pathfmt):
-        if not self._frames:
-            return
+    def finalize(self):
+        for future in self.futures:
+            future.result()
+        self.futures = []
+
+    def _convert_task(self, zippath, ziprealpath, outpath, frames, key):
+        """Convert 'zippath' and return True on success"""
+        try:
+            retcode = self._convert(zippath, outpath, frames)
+        except OSError as exc:
+            self._error(exc)
+            retcode = None
+        except Exception as exc:
+            self.log.error("%s: %s", exc.__class__.__name__, exc)
+            self.log.debug("", exc_info=True)
+            retcode = None
+
+        try:
+            if retcode != 0 or not self.delete:
+                os.replace(zippath, ziprealpath)
+            else:
+                os.unlink(zippath)
+        except OSError as exc:
+            self.log.warning("Unable to move or delete '%s' (%s: %s)",
+                             zippath, exc.__class__.__name__, exc)
 
-        rate_in, rate_out = self.calculate_framerate(self._frames)
+        if retcode != 0:
+            # don't let an incomplete output file count as downloaded
+            try:
+                os.unlink(outpath)
+            except OSError:
+                pass
+            return False
+        if key:
+            self._cache_store(key, outpath)
+        return True
+
+    def _convert(self, zippath, outpath, frames):
+        """Convert the frames in 'zippath' and write the result to 'outpath'
+
+        Returns the exit status of the last FFmpeg invocation.
+        """
+        rate_in, rate_out = self.calculate_framerate(frames)
 
         with tempfile.TemporaryDirectory() as tempdir:
-            # extract frames
-            with zipfile.ZipFile(pathfmt.temppath) as zfile:
-                zfile.extractall(tempdir)
-
-            # write ffconcat file
-            ffconcat = tempdir + "/ffconcat.txt"
-            with open(ffconcat, "w") as file:
-                file.write("ffconcat version 1.0\n")
-                for frame in self._frames:
-                    file.write("file '{}'\n".format(frame["file"]))
-                    file.write("duration {}\n".format(frame["delay"] / 1000))
-                if self.extension != "gif":
-                    # repeat the last frame to prevent it from only being
-                    # displayed for a very short amount of time
-                    file.write("file '{}'\n".format(self._frames[-1]["file"]))
+            files = self._frame_urls(zippath, frames) \
+                if self.stream else None
+
+            if files:
+                # let FFmpeg read all frames directly from the ZIP archive
+                # and pass the ffconcat script over stdin
+                script = self._ffconcat(frames, files).encode()
+                ffconcat = "pipe:0"
+                input_args = ["-f", "concat", "-safe", "0",
+                              "-protocol_whitelist", "file,pipe,subfile"]
+            else:
+                # extract frames
+                with zipfile.ZipFile(zippath) as zfile:
+                    zfile.extractall(tempdir)
+
+                # write ffconcat file
+                script = None
+                ffconcat = tempdir + "/ffconcat.txt"
+                input_args = ()
+                with open(ffconcat, "w") as file:
+                    file.write(self._ffconcat(
+                        frames, [frame["file"] for frame in frames]))
 
             # collect command-line arguments
             args = [self.ffmpeg]
             if rate_in:
                 args += ["-r", str(rate_in)]
+            args += input_args
             args += ["-i", ffconcat]
             if rate_out:
                 args += ["-r", str(rate_out)]
@@ -102,31 +208,134 @@ class UgoiraPP(PostProcessor):
             self.log.debug("ffmpeg args: %s", args)
 
             # invoke ffmpeg
-            pathfmt.set_extension(self.extension)
+            if self.twopass:
+                if "-f" not in args:
+                    args += ["-f", self.extension]
+                args += ["-passlogfile", tempdir + "/ffmpeg2pass", "-pass"]
+                self._exec(args + ["1", "-y", os.devnull], script)
+                return self._exec(args + ["2", outpath], script)
+            args.append(outpath)
+            return self._exec(args, script)
+
+    def _error(self, exc):
+        self.log.error("Unable to invoke FFmpeg (%s: %s)",
+                       exc.__class__.__name__, exc)
+
+    def _cache_key(self, zippath, frames):
+        """Return a key identifying the result of converting 'zippath'"""
+        sha256 = hashlib.sha256()
+        with open(zippath, "rb") as fp:
+            for chunk in iter(lambda: fp.read(65536), b""):
+                sha256.update(chunk)
+        sha256.update(repr((
+            self.extension, list(self.args), self.twopass, self.prevent_odd,
+            self.calculate_framerate(frames),
+            [(frame["file"], frame["delay"]) for frame in frames],
+        )).encode())
+        return sha256.hexdigest() + "." + self.extension
+
+    def _cache_load(self, key, outpath):
+        """Copy a cached conversion result to 'outpath'"""
+        path = os.path.join(self.cache, key)
+        if not os.path.exists(path):
+            return False
+        try:
             try:
-                if self.twopass:
-                    if "-f" not in args:
-                        args += ["-f", self.extension]
-                    args += ["-passlogfile", tempdir + "/ffmpeg2pass", "-pass"]
-                    self._exec(args + ["1", "-y", os.devnull])
-                    self._exec(args + ["2", pathfmt.realpath])
-                else:
-                    args.append(pathfmt.realpath)
-                    self._exec(args)
-            except OSError as exc:
-                print()
-                self.log.error("Unable to invoke FFmpeg (%s: %s)",
-                               exc.__class__.__name__, exc)
-                pathfmt.realpath = pathfmt.temppath
-            else:
-                if self.delete:
-                    pathfmt.delete = True
-                else:
-                    pathfmt.set_extension("zip")
+                os.link(path, outpath)
+            except OSError:
+                shutil.copyfile(path, outpath)
+        except OSError as exc:
+            self.log.warning("Unable to use cached conversion (%s: %s)",
+                             exc.__class__.__name__, exc)
+            return False
+        return True
 
-    def _exec(self, args):
+    def _cache_store(self, key, outpath):
+        """Add the conversion result in 'outpath' to the cache"""
+        path = os.path.join(self.cache, key)
+        temppath = "{}.{}.part".format(path, threading.get_ident())
+        try:
+            os.makedirs(self.cache, exist_ok=True)
+            try:
+                os.link(outpath, temppath)
+            except OSError:
+                shutil.copyfile(outpath, temppath)
+            os.replace(temppath, path)
+        except OSError as exc:
+            self.log.warning("Unable to cache conversion (%s: %s)",
+                             exc.__class__.__name__, exc)
+
+    def _exec(self, args, stdin=None):
         out = None if self.output else subprocess.DEVNULL
-        return subprocess.Popen(args, stdout=out, stderr=out).wait()
+        if stdin is None:
+            return subprocess.Popen(args, stdout=out, stderr=out).wait()
+        process = subprocess.Popen(
+            args, stdin=subprocess.PIPE, stdout=out, stderr=out)
+        process.communicate(stdin)
+        return process.returncode
+
+    def _ffconcat(self, frames, files):
+        """Build an ffconcat script for 'frames' stored in 'files'"""
+        files = ["'" + file.replace("'", "'\\''") + "'" for file in files]
+        lines = ["ffconcat version 1.0"]
+        for frame, file in zip(frames, files):
+            lines.append("file " + file)
+            lines.append("duration {}".format(frame["delay"] / 1000))
+        if self.extension != "gif":
+            # repeat the last frame to prevent it from only being
+            # displayed for a very short amount of time
+            lines.append("file " + files[-1])
+        lines.append("")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _frame_urls(path, frames):
+        """Return FFmpeg 'subfile' URLs for each frame inside a ZIP archive
+
+        Returns None if any frame is not stored uncompressed.
+        """
+        urls = []
+        path = os.path.abspath(path)
+        try:
+            with open(path, "rb") as fp, zipfile.ZipFile(fp) as zfile:
+                for frame in frames:
+                    info = zfile.getinfo(frame["file"])
+                    if info.compress_type != zipfile.ZIP_STORED or \
+                            info.flag_bits & 0x1:
+                        return None
+
+                    # skip local file header to get the start of its data
+                    fp.seek(info.header_offset)
+                    header = fp.read(30)
+                    if header[:4] != b"PK\x03\x04":
+                        return None
+                    namelen, extralen = struct.unpack("<HH", header[26:30])
+                    start = info.header_offset + 30 + namelen + extralen
+
+                    urls.append("subfile,,start,{},end,{},,:{}".format(
+                        start, start + info.file_size, path))
+        except (OSError, KeyError, zipfile.BadZipFile):
+            return None
+        return urls
+
+    @staticmethod
+    def _frames(kwdict):
+        if "frames" in kwdict:
+            return kwdict["frames"]
+        if "pixiv_ugoira_frame_data" in kwdict:
+            return kwdict["pixiv_ugoira_frame_data"]["data"]
+        return None
+
+    @classmethod
+    def _pool(cls, workers):
+        """Return the worker pool shared by all UgoiraPP instances"""
+        with cls._pool_lock:
+            if not cls._pool_executor:
+                if not workers or workers is True or workers < 1:
+                    workers = os.cpu_count() or 1
+                cls._pool_executor = concurrent.futures.ThreadPoolExecutor(
+                    workers)
+        return cls._pool_executor
 
     @staticmethod
     def calculate_framerate(framelist):
@@ -9,10 +9,20 @@
 """Store files in ZIP archives"""
 
 from .common import PostProcessor
+import threading
 import zipfile
+import json
+import struct
+import time
+import sys
 import os
 
 
+# local file header, central directory file header,
+# end of central directory record (ZIP64 and regular)
+SIGNATURES = (b"PK\x03\x04", b"PK\x01\x02", b"PK\x06\x06", b"PK\x05\x06")
+
+
 class ZipPP(PostProcessor):
 
     COMPRESSION_ALGORITHMS = {
@@ -37,13 +47,29 @@ class ZipPP(PostProcessor):
         args = (self.path[:-1] + ext, "a",
                 self.COMPRESSION_ALGORITHMS[algorithm], True)
 
-        if options.get("mode") == "safe":
+        mode = options.get("mode")
+        self.journal = None
+        if mode == "safe":
+            # record each entry in an index file next to the archive
+            # to be able to restore its central directory after a crash
             self.run = self._write_safe
-            self.zfile = None
-            self.args = args
+            self.zfile = self._open(args, True)
         else:
             self.run = self._write
-            self.zfile = zipfile.ZipFile(*args)
+            self.zfile = self._open(args)
+            if mode == "stream" and sys.version_info < (3, 6):
+                # ZipFile.open() supports writing since Python 3.6
+                self.log.warning("'stream' mode requires Python 3.6 or "
+                                 "higher; falling back to 'default'")
+            elif mode == "stream":
+                # let downloaders write directly into the archive
+                self.run = self._write_stream
+                self.entry = None
+                self.lock = threading.Lock()
+                pathfmt.writer = self
+
+    def prepare(self, pathfmt):
+        pathfmt.kwdict.pop("_zipped", None)
 
     def _write(self, pathfmt, zfile=None):
         # 'NameToInfo' is not officially documented, but it's available
@@ -56,13 +82,248 @@ class ZipPP(PostProcessor):
             pathfmt.delete = self.delete
 
     def _write_safe(self, pathfmt):
-        with zipfile.ZipFile(*self.args) as zfile:
-            self._write(pathfmt, zfile)
+        zfile = self.zfile
+        if pathfmt.filename not in zfile.NameToInfo:
+            self._write(pathfmt)
+            zfile.fp.flush()
+            self._journal(zfile.filelist[-1], zfile.start_dir)
+            self.journal.flush()
+
+    def _journal(self, zinfo, end):
+        """Add an index entry for 'zinfo' ending at offset 'end'"""
+        self.journal.write(json.dumps((
+            zinfo.filename, zinfo.header_offset, end, zinfo.CRC,
+            zinfo.compress_size, zinfo.file_size, zinfo.compress_type,
+            zinfo.flag_bits, zinfo.date_time, zinfo.external_attr,
+        )) + "\n")
+
+    def _write_stream(self, pathfmt):
+        if "_zipped" not in pathfmt.kwdict:
+            # not downloaded through 'open()'
+            with self.lock:
+                return self._write(pathfmt)
+        # there is no file on disk to move or delete
+        pathfmt.temppath = pathfmt.realpath
+        pathfmt.delete = False
+
+    def open(self, pathfmt, mode="wb"):
+        """Return a file object writing into a new archive entry"""
+        self.lock.acquire()
+        try:
+            return self._open_entry(pathfmt)
+        except BaseException:
+            self.lock.release()
+            raise
+
+    def _open_entry(self, pathfmt):
+        if self.entry and self.entry.filename == pathfmt.filename:
+            # download gets retried
+            self._remove(self.entry)
+        self.entry = None
+
+        if pathfmt.filename in self.zfile.NameToInfo:
+            return ZipEntryFile(self, pathfmt, None)
+
+        zinfo = zipfile.ZipInfo(pathfmt.filename, time.localtime()[:6])
+        zinfo.compress_type = self.zfile.compression
+        zinfo.external_attr = 0o644 << 16
+        return ZipEntryFile(self, pathfmt, zinfo)
+
+    def discard(self, pathfmt):
+        """Remove the archive entry of a failed download"""
+        with self.lock:
+            if self.entry and self.entry.filename == pathfmt.filename:
+                self._remove(self.entry)
+            self.entry = None
+
+    def _remove(self, zinfo):
+        """Remove the last entry from the archive"""
+        zfile = self.zfile
+        if not zfile.filelist or zfile.filelist[-1] is not zinfo:
+            return
+        del zfile.filelist[-1]
+        del zfile.NameToInfo[zinfo.filename]
+        zfile.fp.seek(zinfo.header_offset)
+        zfile.fp.truncate()
+        zfile.start_dir = zinfo.header_offset
+
+    def _rename(self, zinfo, name):
+        """Change the name of the last archive entry"""
+        old = zinfo.filename.encode("utf-8")
+        new = name.encode("utf-8")
+        if len(old) != len(new):
+            self.log.warning("Unable to rename '%s' to '%s'",
+                             zinfo.filename, name)
+            return
+        zfile = self.zfile
+        zfile.fp.seek(zinfo.header_offset + 30)
+        zfile.fp.write(new)
+        zfile.fp.seek(zfile.start_dir)
+        del zfile.NameToInfo[zinfo.filename]
+        zinfo.filename = zinfo.orig_filename = name
+        zfile.NameToInfo[name] = zinfo
+
+    def _open(self, args, journal=False):
+        """Open a ZIP archive and recover its central directory if needed"""
+        path = args[0]
+        index = path + ".index"
+        try:
+            recover = os.path.getsize(path) and not zipfile.is_zipfile(path)
+        except OSError:
+            recover = False
+
+        if recover:
+            self.log.warning("Recovering entries of damaged ZIP archive '%s'",
+                             path)
+            entries = None
+            if os.path.exists(index):
+                entries = self._recover_index(path, index)
+            if entries is None:
+                entries = self._recover(path)
+            zfile = zipfile.ZipFile(*args)
+            for zinfo in entries:
+                zfile.filelist.append(zinfo)
+                zfile.NameToInfo[zinfo.filename] = zinfo
+        else:
+            zfile = zipfile.ZipFile(*args)
+
+        if journal:
+            # new entries overwrite the current central directory,
+            # so the index needs to cover all existing entries as well
+            self.journal = open(index, "w", encoding="utf-8")
+            entries = sorted(zfile.filelist, key=lambda z: z.header_offset)
+            offsets = [z.header_offset for z in entries[1:]]
+            offsets.append(zfile.start_dir)
+            for zinfo, end in zip(entries, offsets):
+                self._journal(zinfo, end)
+            self.journal.flush()
+        elif os.path.exists(index):
+            os.unlink(index)
+        return zfile
+
+    @staticmethod
+    def _recover_index(path, index):
+        """Collect all archive entries listed in an index file
+        and truncate everything after them"""
+        entries = []
+        offset = 0
+
+        try:
+            with open(index, encoding="utf-8") as fp:
+                lines = fp.readlines()
+        except OSError:
+            return None
+
+        with open(path, "r+b") as fp:
+            filesize = fp.seek(0, 2)
+            for line in lines:
+                try:
+                    (name, start, end, crc, csize, usize, method,
+                     flags, date_time, attr) = json.loads(line)
+                except ValueError:
+                    # incomplete last line
+                    break
+                if start != offset or end > filesize:
+                    break
+                fp.seek(start)
+                if fp.read(4) != b"PK\x03\x04":
+                    break
+
+                zinfo = zipfile.ZipInfo(name, tuple(date_time))
+                zinfo.flag_bits = flags
+                zinfo.compress_type = method
+                zinfo.CRC = crc
+                zinfo.compress_size = csize
+                zinfo.file_size = usize
+                zinfo.header_offset = start
+                zinfo.external_attr = attr
+                entries.append(zinfo)
+                offset = end
+
+            if not entries:
+                return None
+            fp.truncate(offset)
+        return entries
+
+    @staticmethod
+    def _recover(path):
+        """Collect all complete entries of a ZIP archive without its
+        central directory and truncate everything after them"""
+        entries = []
+        offset = 0
+
+        with open(path, "r+b") as fp:
+            filesize = fp.seek(0, 2)
+            while True:
+                fp.seek(offset)
+                header = fp.read(30)
+                if len(header) < 30 or header[:4] != b"PK\x03\x04":
+                    break
+                (_, version, system, flags, method, dostime, dosdate, crc,
+                 csize, usize, namelen, extralen) = struct.unpack(
+                    "<4s2B4HL2L2H", header)
+                if flags & 0x08:
+                    # sizes are stored after its data
+                    break
+                name = fp.read(namelen)
+                extra = fp.read(extralen)
+
+                # read and strip ZIP64 extra field
+                rest = b""
+                while len(extra) >= 4:
+                    tag, size = struct.unpack("<HH", extra[:4])
+                    if tag == 1 and size >= 16:
+                        usize, csize = struct.unpack("<QQ", extra[4:20])
+                    else:
+                        rest += extra[:size+4]
+                    extra = extra[size+4:]
+
+                if method == zipfile.ZIP_STORED and csize != usize:
+                    break
+
+                # check if this entry is complete
+                # and another header follows right after it
+                end = offset + 30 + namelen + extralen + csize
+                if end > filesize:
+                    break
+                fp.seek(end)
+                signature = fp.read(4)
+                if signature and signature not in SIGNATURES:
+                    break
+
+                zinfo = zipfile.ZipInfo(
+                    name.decode("utf-8" if flags & 0x800 else "cp437"), (
+                        (dosdate >> 9) + 1980, (dosdate >> 5) & 0xF,
+                        dosdate & 0x1F, dostime >> 11,
+                        (dostime >> 5) & 0x3F, (dostime & 0x1F) * 2,
+                    ))
+                zinfo.extract_version = version
+                zinfo.flag_bits = flags
+                zinfo.compress_type = method
+                zinfo.CRC = crc
+                zinfo.compress_size = csize
+                zinfo.file_size = usize
+                zinfo.header_offset = offset
+                zinfo.extra = rest
+                zinfo.external_attr = 0o644 << 16
+                entries.append(zinfo)
+                offset = end
+
+            fp.truncate(offset)
+        return entries
 
     def finalize(self):
         if self.zfile:
             self.zfile.close()
 
+        if self.journal:
+            # the archive's central directory is complete
+            self.journal.close()
+            try:
+                os.unlink(self.journal.name)
+            except OSError:
+                pass
+
         if self.delete:
             try:
                 # remove target directory
@@ -78,4 +339,62 @@ class ZipPP(PostProcessor):
                     pass
 
 
+class ZipEntryFile():
+    """Write-only file object for a single ZIP archive entry"""
+
+    def __init__(self, zippp, pathfmt, zinfo):
+        self.zippp = zippp
+        self.pathfmt = pathfmt
+        self.zinfo = zinfo
+        self.fp = zippp.zfile.open(
+            zinfo, "w", force_zip64=True) if zinfo else None
+        self.closed = False
+        self.size = 0
+        self.header = b""
+        self.position = 0
+
+    def write(self, data):
+        if len(self.header) < 16:
+            self.header += data[:16 - len(self.header)]
+        if self.fp:
+            self.fp.write(data)
+        self.size += len(data)
+
+    def tell(self):
+        return self.size
+
+    def seek(self, position):
+        # only used to read the file's header
+        self.position = position
+
+    def read(self, size=-1):
+        data = self.header[self.position:]
+        if size >= 0:
+            data = data[:size]
+        self.position += len(data)
+        return data
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.pathfmt.kwdict["_zipped"] = True
+
+        try:
+            if self.fp:
+                self.fp.close()
+                self.zippp.entry = self.zinfo
+                if self.pathfmt.filename != self.zinfo.filename:
+                    # filename extension got adjusted
+                    self.zippp._rename(self.zinfo, self.pathfmt.filename)
+        finally:
+            self.zippp.lock.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
 __postprocessor__ = ZipPP
@@ -18,9 +18,12 @@ import string
 import _string
 import sqlite3
 import datetime
+import bisect
 import operator
 import itertools
+import collections
 import urllib.parse
+import concurrent.futures
 from email.utils import mktime_tz, parsedate_tz
 from . import text, exception
 
@@ -204,6 +207,7 @@ class RangePredicate():
     """Predicate; True if the current index is in the given range"""
     def __init__(self, rangespec):
         self.ranges = self.optimize_range(self.parse_range(rangespec))
+        self.lowers = [lower for lower, _ in self.ranges]
         self.index = 0
 
         if self.ranges:
@@ -212,15 +216,23 @@ class RangePredicate():
             self.lower, self.upper = 0, 0
 
     def __call__(self, url, kwds):
-        self.index += 1
+        self.index = index = self.index + 1
 
-        if self.index > self.upper:
+        if index > self.upper:
             raise exception.StopExtraction()
 
-        for lower, upper in self.ranges:
-            if lower <= self.index <= upper:
-                return True
-        return False
+        pos = bisect.bisect_right(self.lowers, index) - 1
+        return pos >= 0 and index <= self.ranges[pos][1]
+
+    def next_index(self):
+        """Return the next index in range or None if there is none"""
+        index = self.index + 1
+        pos = bisect.bisect_right(self.lowers, index) - 1
+        if pos >= 0 and index <= self.ranges[pos][1]:
+            return index
+        if pos + 1 < len(self.ranges):
+            return self.ranges[pos + 1][0]
+        return None
 
     @staticmethod
     def parse_range(rangespec):
@@ -285,6 +297,91 @@ class UniquePredicate():
         return False
 
 
+class OrderedPredicate():
+    """Base class for predicates on results ordered newest first
+
+    Raises StopExtraction after 'limit' consecutive older values,
+    to allow for pinned posts and similar out-of-order results.
+    """
+    def __init__(self, limit=1):
+        self.limit = limit
+        self.count = 0
+        self.last = None
+        self.reached = False
+
+    def _newer(self):
+        self.count = 0
+        return True
+
+    def _older(self, value):
+        # several files can share the same value
+        if value != self.last:
+            self.last = value
+            self.count += 1
+            if self.count >= self.limit:
+                self.reached = True
+                raise exception.StopExtraction()
+        return False
+
+
+class WatermarkPredicate(OrderedPredicate):
+    """Predicate; True if a file's 'key' value is newer than 'mark'
+
+    The newest value of all successfully handled files needs to be
+    reported with record() and becomes 'value'.
+    """
+    def __init__(self, key, mark=None, limit=1):
+        OrderedPredicate.__init__(self, limit)
+        self.key = key
+        self.mark = self.value = mark
+        self.failed = False
+
+    def __call__(self, url, kwds):
+        value = self._value(kwds)
+        if value is None:
+            return True
+        if self.mark is None or value > self.mark:
+            return self._newer()
+        return self._older(value)
+
+    def record(self, kwds):
+        """Remember the value of a downloaded or skipped file"""
+        value = self._value(kwds)
+        if value is not None and (self.value is None or value > self.value):
+            self.value = value
+
+    def _value(self, kwds):
+        value = kwds.get(self.key)
+        if isinstance(value, str):
+            return int(value) if value.isdecimal() else None
+        return value
+
+
+class DatePredicate(OrderedPredicate):
+    """Predicate; True if a file's 'key' date is between 'dmin' and 'dmax'
+
+    Expects files ordered newest first and raises StopExtraction
+    after 'limit' consecutive dates before 'dmin'.
+    """
+    def __init__(self, key, dmin=None, dmax=None, limit=3):
+        OrderedPredicate.__init__(self, limit)
+        self.key = key
+        self.dmin = dmin
+        self.dmax = dmax
+
+    def __call__(self, url, kwds):
+        date = kwds.get(self.key)
+        if isinstance(date, datetime.datetime):
+            date = date.replace(tzinfo=datetime.timezone.utc).timestamp()
+        elif not isinstance(date, (int, float)):
+            return True
+
+        if self.dmin is not None and date < self.dmin:
+            return self._older(date)
+        self._newer()
+        return self.dmax is None or date <= self.dmax
+
+
 class FilterPredicate():
     """Predicate; True if evaluating the given expression returns True"""
     globalsdict = {
@@ -320,6 +417,57 @@ class ChainPredicate():
         return True
 
 
+class Lookahead():
+    """Call 'func' in background threads before its results are needed
+
+    Results get returned by pop() in the order their calls were
+    submitted. Without any 'workers', 'func' only gets called by pop()
+    in the current thread.
+    """
+    def __init__(self, func, workers):
+        self.func = func
+        self.pending = collections.deque()
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            workers) if workers else None
+
+    def __len__(self):
+        return len(self.pending)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def submit(self, key, *args):
+        """Schedule a call of 'func(*args)' returning its result with 'key'"""
+        if self.executor:
+            self.pending.append(
+                (key, self.executor.submit(self.func, *args), None))
+        else:
+            self.pending.append((key, None, args))
+
+    def put(self, key, result):
+        """Add an already known 'result' in between submitted calls"""
+        future = concurrent.futures.Future()
+        future.set_result(result)
+        self.pending.append((key, future, None))
+
+    def pop(self):
+        """Return 'key' and result of the oldest pending call"""
+        key, future, args = self.pending.popleft()
+        return key, future.result() if future else self.func(*args)
+
+    def close(self):
+        """Cancel all pending calls"""
+        for _, future, _ in self.pending:
+            if future:
+                future.cancel()
+        self.pending.clear()
+        if self.executor:
+            self.executor.shutdown(wait=False)
+
+
 class ExtendedUrl():
     """URL with attached config key-value pairs"""
     def __init__(self, url, gconf, lconf):
@@ -544,6 +692,9 @@ class PathFormat():
         self.prefix = ""
         self.kwdict = {}
         self.delete = False
+        self.writer = None
+        self.deferred = None
+        self.linked = False
         self.path = self.realpath = self.temppath = ""
 
         basedir = expand_path(
@@ -581,8 +732,34 @@ class PathFormat():
 
     def open(self, mode="wb"):
         """Open file and return a corresponding file object"""
+        if self.writer:
+            return self.writer.open(self, mode)
+        if mode[0] == "w":
+            self._unlink_shared(self.temppath)
+        elif mode[0] == "a" or "+" in mode:
+            self._unlink_shared(self.temppath, True)
         return open(self.temppath, mode)
 
+    @staticmethod
+    def _unlink_shared(path, keep=False):
+        """Remove 'path' if it is linked to other files
+
+        Writing to a hardlink or symlink would otherwise change all files
+        sharing its content, e.g. the ones created by 'dedup'.
+        With 'keep', 'path' gets replaced by a copy of its content instead.
+        """
+        try:
+            if os.lstat(path).st_nlink < 2 and not os.path.islink(path):
+                return
+        except OSError:
+            return
+        if keep:
+            temppath = path + ".copy"
+            shutil.copyfile(path, temppath)
+            os.replace(temppath, path)
+        else:
+            os.unlink(path)
+
     def exists(self, archive=None):
         """Return True if the file exists on disk or in 'archive'"""
         if archive and self.kwdict in archive:
@@ -644,6 +821,7 @@ class PathFormat():
         """Set general filename data"""
         self.kwdict = kwdict
         self.temppath = self.prefix = ""
+        self.linked = False
         self.extension = kwdict["extension"]
 
         if self.extension:
@@ -713,6 +891,7 @@ class PathFormat():
             try:
                 os.replace(self.temppath, self.realpath)
             except OSError:
+                self._unlink_shared(self.realpath)
                 shutil.copyfile(self.temppath, self.realpath)
                 os.unlink(self.temppath)
 
@@ -753,3 +932,19 @@ class DownloadArchive():
         key = self.keygen(kwdict)
         self.cursor.execute(
             "INSERT OR IGNORE INTO archive VALUES (?)", (key,))
+
+    def values(self, kwdict, key):
+        """Return the 'key' values of all entries matching 'kwdict'"""
+        marker = "\0"
+        prefix, _, suffix = self.keygen(
+            dict(kwdict, **{key: marker})).partition(marker)
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        self.cursor.execute(
+            "SELECT entry FROM archive WHERE entry >= ? AND entry < ?",
+            (prefix, upper))
+        start, end = len(prefix), len(suffix)
+        return [
+            entry[start:len(entry)-end]
+            for entry, in self.cursor
+            if entry.endswith(suffix)
+        ]
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright 2019 Mike Fährmann
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation.
+
+import os
+import time
+import pickle
+import tempfile
+import threading
+import unittest
+from unittest.mock import Mock
+
+from gallery_dl import config
+
+dbdir = tempfile.TemporaryDirectory()
+dbpath = os.path.join(dbdir.name, "cache.sqlite3")
+config.set(("cache",), {"file": dbpath})
+from gallery_dl import cache  # noqa E402
+
+
+def setUpModule():
+    # the cache module might have been imported by other tests before
+    cache.DatabaseCacheDecorator.path = dbpath
+    cache.DatabaseCacheDecorator._local = threading.local()
+    cache.DatabaseCacheDecorator._init = True
+
+
+def tearDownModule():
+    config.clear()
+    dbdir.cleanup()
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_eviction(self):
+        lru = cache.LRUCache(3)
+        for i in range(3):
+            lru[i] = i
+        self.assertEqual(len(lru), 3)
+        self.assertEqual(lru.evictions, 0)
+
+        lru[0]       # mark '0' as recently used
+        lru[3] = 3   # evicts '1'
+        self.assertEqual(lru.evictions, 1)
+        self.assertIn(0, lru)
+        self.assertNotIn(1, lru)
+        self.assertIn(3, lru)
+
+        with self.assertRaises(KeyError):
+            lru[1]
+
+        del lru[0]
+        self.assertEqual(len(lru), 2)
+
+
+class TestDatabaseCache(unittest.TestCase):
+
+    def _decorator(self, maxage=100):
+        func = Mock(__module__="test", __name__=self.id().rpartition(".")[2])
+        func.side_effect = lambda key: key + "-value"
+        return func, cache.DatabaseCacheDecorator(func, 0, maxage)
+
+    def test_lookup(self):
+        func, deco = self._decorator()
+
+        self.assertEqual(deco("a"), "a-value")
+        self.assertEqual(deco("a"), "a-value")
+        self.assertEqual(func.call_count, 1)
+
+        # database lookup with a cold in-memory cache
+        deco.cache.clear()
+        self.assertEqual(deco("a"), "a-value")
+        self.assertEqual(func.call_count, 1)
+
+        deco.invalidate("a")
+        self.assertEqual(deco("a"), "a-value")
+        self.assertEqual(func.call_count, 2)
+
+    def test_update(self):
+        func, deco = self._decorator()
+        deco.update("b", "foo")
+        deco.cache.clear()
+        self.assertEqual(deco("b"), "foo")
+        self.assertEqual(func.call_count, 0)
+
+    def test_expired(self):
+        func, deco = self._decorator(maxage=-1)
+        deco("c")
+        deco("c")
+        self.assertEqual(func.call_count, 2)
+
+    def test_memory_bound(self):
+        func, deco = self._decorator()
+        deco.cache = cache.LRUCache(2)
+        for key in "abc":
+            deco(key)
+        self.assertEqual(len(deco.cache), 2)
+        self.assertEqual(deco.cache.evictions, 1)
+
+    def test_connection_per_thread(self):
+        func, deco = self._decorator()
+        deco("d")
+        connections = [cache.DatabaseCacheDecorator.connection()]
+
+        def target():
+            deco.cache.clear()
+            self.assertEqual(deco("d"), "d-value")
+            connections.append(cache.DatabaseCacheDecorator.connection())
+
+        thread = threading.Thread(target=target)
+        thread.start()
+        thread.join()
+
+        self.assertEqual(len(connections), 2)
+        self.assertIsNot(connections[0], connections[1])
+        self.assertEqual(func.call_count, 1)
+
+    def test_single_flight_threads(self):
+        func, deco = self._decorator()
+        barrier = threading.Barrier(4)
+        results = []
+
+        def slow(key):
+            time.sleep(0.2)
+            return key + "-value"
+        func.side_effect = slow
+
+        def target():
+            barrier.wait()
+            results.append(deco("e"))
+
+        threads = [threading.Thread(target=target) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(func.call_count, 1)
+        self.assertEqual(results, ["e-value"] * 4)
+
+    def test_single_flight_lease(self):
+        func, deco = self._decorator()
+        deco.interval = 0.05
+        fullkey = deco.key + "-f"
+        cursor = cache.DatabaseCacheDecorator.cursor()
+
+        # simulate another process holding the lease for key 'f'
+        cursor.execute("INSERT INTO lease VALUES (?, 'other', ?)",
+                       (fullkey, int(time.time()) + 60))
+        results = []
+        thread = threading.Thread(target=lambda: results.append(deco("f")))
+        thread.start()
+
+        time.sleep(0.2)
+        self.assertEqual(results, [])
+
+        # other keys sharing the lock stripe of 'f' are not blocked
+        stripe = hash("f") % deco.stripes
+        other = next(key for key in map(str, range(1000))
+                     if hash(key) % deco.stripes == stripe)
+        self.assertEqual(deco(other), other + "-value")
+
+        cursor.execute("INSERT INTO data VALUES (?,?,?)", (
+            fullkey, pickle.dumps("other-value"), int(time.time()) + 60))
+        cursor.execute("DELETE FROM lease WHERE key=?", (fullkey,))
+        thread.join()
+
+        self.assertEqual(results, ["other-value"])
+        self.assertEqual(func.call_count, 1)
+
+    def test_single_flight_stale_lease(self):
+        func, deco = self._decorator()
+        fullkey = deco.key + "-g"
+        cursor = cache.DatabaseCacheDecorator.cursor()
+        cursor.execute("INSERT INTO lease VALUES (?, 'other', ?)",
+                       (fullkey, int(time.time()) - 1))
+
+        self.assertEqual(deco("g"), "g-value")
+        self.assertEqual(func.call_count, 1)
+        cursor.execute("SELECT COUNT(*) FROM lease WHERE key=?", (fullkey,))
+        self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_single_flight_error(self):
+        func, deco = self._decorator()
+        func.side_effect = ValueError()
+        with self.assertRaises(ValueError):
+            deco("h")
+
+        func.side_effect = None
+        func.return_value = "h-value"
+        self.assertEqual(deco("h"), "h-value")
+
+    def test_single_flight_locks(self):
+        func, deco = self._decorator()
+        locks = list(deco.locks)
+        for num in range(100):
+            deco(str(num))
+        self.assertEqual(deco.locks, locks)
+        self.assertEqual(len(locks), deco.stripes)
+
+    def test_single_flight_writes(self):
+        func, deco = self._decorator()
+        statements = []
+        db = cache.DatabaseCacheDecorator.connection()
+        db.set_trace_callback(statements.append)
+        try:
+            deco("n")
+        finally:
+            db.set_trace_callback(None)
+
+        # one statement to acquire the lease,
+        # one transaction to store the result and release it
+        writes = [stmt.split()[0] for stmt in statements
+                  if not stmt.startswith("SELECT")]
+        self.assertEqual(
+            writes, ["INSERT", "BEGIN", "INSERT", "DELETE", "COMMIT"])
+        cursor = cache.DatabaseCacheDecorator.cursor()
+        cursor.execute("SELECT COUNT(*) FROM lease WHERE key=?",
+                       (deco.key + "-n",))
+        self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_prune(self):
+        func, deco = self._decorator(maxage=-1)
+        deco("i")
+        _, deco2 = self._decorator()
+        deco2.key += "2"
+        deco2("i")
+
+        self.assertGreaterEqual(cache.prune(), 1)
+        self.assertEqual(cache.prune(), 0)
+        cursor = cache.DatabaseCacheDecorator.cursor()
+        cursor.execute("SELECT key FROM data WHERE key LIKE 'test.%-i'")
+        self.assertEqual(cursor.fetchall(), [(deco2.key + "-i",)])
+
+    def test_clear_prefix(self):
+        _, deco1 = self._decorator()
+        _, deco2 = self._decorator()
+        deco1.key = "gallery_dl.extractor.foo.func"
+        deco2.key = "gallery_dl.extractor.foobar.func"
+        for key in "jk":
+            deco1(key)
+            deco2(key)
+
+        self.assertEqual(cache.clear("foo"), 2)
+        deco1.cache.clear()
+        deco2.cache.clear()
+        deco1("j")
+        deco2("j")
+        self.assertEqual(deco1.func.call_count, 3)
+        self.assertEqual(deco2.func.call_count, 2)
+
+    def test_stats(self):
+        _, deco = self._decorator()
+        deco.key = "gallery_dl.extractor.stats.func"
+        deco("l")
+        deco("l")
+        deco("m")
+
+        mem = cache.MemoryCacheDecorator(Mock(
+            __module__="gallery_dl.extractor.stats", __name__="memfunc",
+        ), None, 100)
+        mem()
+        mem()
+
+        stats = {row[0]: row[1:] for row in cache.stats()}
+        entries, expired, size, hits, misses = stats[deco.key]
+        self.assertEqual(entries, 2)
+        self.assertEqual(expired, 0)
+        self.assertGreater(size, 0)
+        self.assertEqual((hits, misses), (1, 2))
+        self.assertEqual(stats[mem.key], (0, 0, 0, 1, 1))
+
+        # counters accumulate in the database
+        deco("l")
+        stats = {row[0]: row[1:] for row in cache.stats()}
+        self.assertEqual(stats[deco.key][3:], (2, 2))
+
+        cache.clear("stats")
+        for row in cache.stats():
+            self.assertNotIn(".stats.", row[0])
+
+    def test_wal(self):
+        cursor = cache.DatabaseCacheDecorator.cursor()
+        cursor.execute("PRAGMA journal_mode")
+        self.assertEqual(cursor.fetchone()[0], "wal")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -11,6 +11,7 @@ import unittest
 import gallery_dl.config as config
 import os
 import tempfile
+import threading
 
 
 class TestConfig(unittest.TestCase):
@@ -40,6 +41,25 @@ class TestConfig(unittest.TestCase):
         self.assertEqual(config.interpolate(["b", "d"], "2"), 123)
         self.assertEqual(config.interpolate(["d", "d"], "2"), 123)
 
+    def test_snapshot(self):
+        snap = config.snapshot(("b",))
+        self.assertEqual(snap["a"], "1")
+        self.assertEqual(snap["c"], "text")
+        self.assertNotIn("d", snap)
+        self.assertIs(config.snapshot(("b",)), snap)
+
+        for keys in (("a",), ("b", "c"), ("b", "d"), ("d", "d"), ("e",)):
+            self.assertEqual(
+                config.snapshot(tuple(keys[:-1])).get(keys[-1], "2"),
+                config.interpolate(keys, "2"),
+            )
+
+        config.set(["b", "d"], 123)
+        self.assertIsNot(config.snapshot(("b",)), snap)
+        self.assertEqual(config.snapshot(("b",))["d"], 123)
+        config.unset(["b", "d"])
+        self.assertNotIn("d", config.snapshot(("b",)))
+
     def test_set(self):
         config.set(["b", "c"], [1, 2, 3])
         config.set(["e", "f", "g"], value=234)
@@ -76,6 +96,38 @@ class TestConfig(unittest.TestCase):
         self.assertEqual(config.get(["b", "c"]), "text")
         self.assertEqual(config.get(["e", "f", "g"]), None)
 
+    def test_apply_isolated(self):
+        results = []
+
+        def check():
+            results.append(config.get(["b", "c"]))
+            results.append(config.snapshot(("b",))["c"])
+
+        with config.apply(((["b", "c"], 1),)):
+            self.assertEqual(config._config["b"]["c"], "text")
+            self.assertEqual(config.interpolate(["b", "c"]), 1)
+
+            with config.apply(((["b", "a"], 3),)):
+                self.assertEqual(config.get(["b"]), {"a": 3, "c": 1})
+            self.assertEqual(config.get(["b"]), {"a": 2, "c": 1})
+
+            # threads do not inherit applied values ...
+            thread = threading.Thread(target=check)
+            thread.start()
+            thread.join()
+
+            # ... unless explicitly bound to them
+            thread = threading.Thread(target=config.bind(check))
+            thread.start()
+            thread.join()
+
+            # global changes remain visible
+            config.set(["b", "d"], 4)
+            self.assertEqual(config.snapshot(("b",))["d"], 4)
+
+        self.assertEqual(results, ["text", "text", 1, 1])
+        self.assertEqual(config.get(["b", "c"]), "text")
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -10,7 +10,9 @@
 import re
 import sys
 import base64
+import hashlib
 import os.path
+import zipfile
 import tempfile
 import threading
 import http.server
@@ -21,6 +23,7 @@ from unittest.mock import Mock, MagicMock, patch
 import gallery_dl.downloader as downloader
 import gallery_dl.extractor as extractor
 import gallery_dl.config as config
+import gallery_dl.postprocessor as postprocessor
 from gallery_dl.downloader.common import DownloaderBase
 from gallery_dl.output import NullOutput
 from gallery_dl.util import PathFormat
@@ -190,6 +193,70 @@ class TestHTTPDownloader(TestDownloaderBase):
         self._run_test(self._png, None, DATA_PNG, "gif", "png")
         self._run_test(self._gif, None, DATA_GIF, "jpg", "gif")
 
+    def test_http_hash(self):
+        config.set(("downloader", "http", "hash"), ["md5", "sha256"])
+        config.set(("downloader", "http", "hash-manifest"), True)
+        config.set(("downloader", "http", "retries"), 0)
+        try:
+            dl = downloader.find("http")(self.extractor, NullOutput())
+        finally:
+            config.unset(("downloader", "http", "hash"))
+            config.unset(("downloader", "http", "hash-manifest"))
+            config.unset(("downloader", "http", "retries"))
+        md5 = hashlib.md5(DATA_PNG).hexdigest()
+        sha256 = hashlib.sha256(DATA_PNG).hexdigest()
+
+        # fresh and resumed downloads
+        for content in (None, DATA_PNG[:12], DATA_PNG):
+            pathfmt = self._prepare_destination(content, extension="png")
+            pathfmt.kwdict["md5"] = md5.upper()
+            pathfmt.kwdict["_original"] = True
+            self.assertTrue(dl.download(self._png, pathfmt))
+            self.assertEqual(pathfmt.kwdict["md5"], md5)
+            self.assertEqual(pathfmt.kwdict["sha256"], sha256)
+            self.assertEqual(pathfmt.kwdict["_download"], (
+                pathfmt.realpath, {"md5": md5, "sha256": sha256}))
+
+        with open(os.path.join(pathfmt.realdirectory, "MD5SUMS")) as file:
+            line = file.readlines()[-1]
+        self.assertEqual(line, "{}  {}\n".format(md5, pathfmt.filename))
+
+        # checksum mismatch
+        pathfmt = self._prepare_destination(None, extension="png")
+        pathfmt.kwdict["md5"] = "0" * 32
+        pathfmt.kwdict["_original"] = True
+        self.assertFalse(dl.download(self._png, pathfmt))
+        self.assertEqual(pathfmt.part_size(), 0)
+
+        # checksums of a different or possibly different file
+        for original in (False, None):
+            pathfmt = self._prepare_destination(None, extension="png")
+            pathfmt.kwdict["md5"] = "0" * 32
+            pathfmt.kwdict["_original"] = original
+            with patch.object(dl.log, "warning") as warning:
+                self.assertTrue(dl.download(self._png, pathfmt))
+            self.assertEqual(warning.called, original is None)
+            self.assertEqual(pathfmt.kwdict["md5"], "0" * 32)
+            self.assertEqual(pathfmt.kwdict["sha256"], sha256)
+            self.assertEqual(pathfmt.kwdict["_download"][1]["md5"], md5)
+
+    def test_http_zip_stream(self):
+        pathfmt = self._prepare_destination(extension="png")
+        pp = postprocessor.find("zip")(pathfmt, {"mode": "stream"})
+        pp.prepare(pathfmt)
+
+        # stale .part file of an earlier download
+        with open(pathfmt.realpath + ".part", "wb") as file:
+            file.write(DATA_PNG[:12])
+        self.assertTrue(self.downloader.download(self._png, pathfmt))
+        pp.run(pathfmt)
+        pp.finalize()
+
+        self.assertTrue(os.path.exists(pathfmt.realpath + ".part"))
+        with zipfile.ZipFile(pp.zfile.filename) as zfile:
+            self.assertEqual(zfile.read(pathfmt.filename), DATA_PNG)
+        os.unlink(pp.zfile.filename)
+
 
 class TestTextDownloader(TestDownloaderBase):
 
@@ -8,10 +8,14 @@
 # published by the Free Software Foundation.
 
 import sys
+import time
+import array
 import unittest
 import string
+import tempfile
+import threading
 
-from gallery_dl import extractor
+from gallery_dl import extractor, config
 from gallery_dl.extractor.common import Extractor, Message
 from gallery_dl.extractor.directlink import DirectlinkExtractor as DLExtractor
 
@@ -141,6 +145,314 @@ class TestExtractor(unittest.TestCase):
                 msg = "'{}' isn't matched by any pattern".format(url)
                 self.fail(msg)
 
+    def test_checkpoint(self):
+        class PagedExtractor(Extractor):
+            category = "paged"
+            subcategory = "test"
+            pattern = "paged:"
+
+            def items(self):
+                yield Message.Version, 1
+                page = self.resume() or 1
+                while page <= 3:
+                    self.checkpoint(page)
+                    for num in range(2):
+                        yield Message.Url, "text:{}-{}".format(page, num), {}
+                    page += 1
+
+        config.set(("extractor", "paged", "resume"), True)
+        try:
+            extr = PagedExtractor.from_url("paged:checkpoint")
+            extr.init_checkpoint()
+            urls = []
+            for msg in extr:
+                if msg[0] == Message.Url:
+                    if len(urls) == 3:
+                        break  # interrupted during the second page
+                    extr.position += 1
+                    urls.append(msg[1])
+            self.assertEqual(urls, ["text:1-0", "text:1-1", "text:2-0"])
+
+            # continue with the second page
+            extr = PagedExtractor.from_url("paged:checkpoint")
+            extr.init_checkpoint()
+            self.assertEqual(extr.position, 2)
+            urls = [msg[1] for msg in extr if msg[0] == Message.Url]
+            self.assertEqual(urls[0], "text:2-0")
+            self.assertEqual(len(urls), 4)
+
+            # no checkpoint after a complete run
+            extr.complete()
+            extr = PagedExtractor.from_url("paged:checkpoint")
+            extr.init_checkpoint()
+            self.assertEqual(extr.position, 0)
+            urls = [msg[1] for msg in extr if msg[0] == Message.Url]
+            self.assertEqual(len(urls), 6)
+            extr.complete()
+        finally:
+            config.unset(("extractor", "paged", "resume"))
+
+    def test_incremental(self):
+        from gallery_dl import job
+        from gallery_dl.extractor import common
+
+        class WatermarkExtractor(Extractor):
+            category = "watermark"
+            subcategory = "test"
+            pattern = "watermark:"
+            watermark = "id"
+
+            def items(self):
+                yield Message.Version, 1
+                for num in range(5, 0, -1):
+                    kwdict = {"id": num, "filename": str(num),
+                              "extension": "txt"}
+                    yield Message.Directory, kwdict
+                    yield Message.Url, self.urls.get(num, "ok"), kwdict
+
+        class WatermarkJob(job.DownloadJob):
+            def download(self, url):
+                if url == "fail":
+                    return False
+                with open(self.pathfmt.temppath, "w") as file:
+                    file.write(url)
+                return True
+
+        def run(urls=None, **options):
+            for key, value in options.items():
+                config.set(("extractor", key), value)
+            try:
+                extr = WatermarkExtractor.from_url("watermark:")
+                extr.urls = urls or {}
+                WatermarkJob(extr).run()
+            finally:
+                for key in options:
+                    config.unset(("extractor", key))
+            return common._watermark_cache("watermark:")
+
+        with tempfile.TemporaryDirectory() as directory:
+            config.set(("base-directory",), directory)
+            config.set(("extractor", "incremental"), True)
+            config.set(("extractor", "skip"), False)
+            common._watermark_cache.invalidate("watermark:")
+            try:
+                # stopped early by a range limit
+                self.assertIsNone(run(**{"image-range": "1-2"}))
+                # failed download
+                self.assertIsNone(run({4: "fail"}))
+                # complete run
+                self.assertEqual(run(), 5)
+            finally:
+                common._watermark_cache.invalidate("watermark:")
+                config.unset(("base-directory",))
+                config.unset(("extractor", "incremental"))
+                config.unset(("extractor", "skip"))
+
+    def test_prefetch(self):
+        from gallery_dl.extractor import booru
+
+        def page(pid):
+            if pid > 2:
+                return []
+            return [{"id": pid * 2 + num, "md5": "0", "file_url":
+                     "text:{}-{}".format(pid, num)} for num in range(2)]
+
+        class PagesExtractor(booru.GelbooruPageMixin, booru.BooruExtractor):
+            category = "pages"
+            pattern = "pages:"
+            per_page = 2
+
+            def fetch_page(self, params):
+                return page(params["pid"])
+
+        class CursorExtractor(booru.DanbooruPageMixin, booru.BooruExtractor):
+            category = "cursor"
+            pattern = "pages:"
+            per_page = 2
+
+            def fetch_page(self, params):
+                # 'b<id>' points to the page before post '<id>'
+                cursor = params["page"]
+                return page(int(cursor[1:]) // 2 + 1 if cursor != 1 else 0)
+
+        expected = ["text:{}-{}".format(pid, num)
+                    for pid in range(3) for num in range(2)]
+        for cls in (PagesExtractor, CursorExtractor):
+            for prefetch in (0, 1, 4):
+                config.set(("extractor", "prefetch"), prefetch)
+                try:
+                    extr = cls.from_url("pages:")
+                    urls = [msg[1] for msg in extr if msg[0] == Message.Url]
+                    self.assertEqual(urls, expected)
+                finally:
+                    config.unset(("extractor", "prefetch"))
+
+    def test_extended_tags(self):
+        from gallery_dl import job, cache
+        from gallery_dl.extractor import booru
+        from unittest.mock import patch
+
+        class TagsExtractor(booru.GelbooruPageMixin, booru.BooruExtractor):
+            category = "extags"
+            pattern = "extags:"
+            post_url = "extags:{}"
+
+            def fetch_page(self, params):
+                return [{"id": num, "md5": "0", "file_url": "text:"}
+                        for num in range(20)]
+
+            def _fetch_tags(self, url):
+                self.fetched.append(url[7:])
+                return booru._parse_tags(
+                    '<ul id="tag-sidebar"><li class="tag-type-artist">'
+                    '<a href="?page=post&amp;s=list&amp;tags={}">'
+                    '</ul>'.format(url[7:]))
+
+        class TagsJob(job.Job):
+            def handle_url(self, url, kwdict):
+                self.tags.append(kwdict["tags_artist"])
+
+        def run(workers, **options):
+            for key, value in options.items():
+                config.set(("extractor", key), value)
+            config.set(("extractor", "tags-workers"), workers)
+            try:
+                extr = TagsExtractor.from_url("extags:")
+                extr.fetched = fetched = []
+                tjob = TagsJob(extr)
+                tjob.tags = []
+                tjob.run()
+            finally:
+                for key in options:
+                    config.unset(("extractor", key))
+                config.unset(("extractor", "tags-workers"))
+            return tjob.tags, sorted(fetched)
+
+        deco = cache.DatabaseCacheDecorator
+        config.set(("extractor", "tags"), True)
+        try:
+            with patch.object(deco, "path", None):
+                for workers in (1, 4):
+                    extr = TagsExtractor.from_url("extags:")
+                    extr.fetched = []
+                    config.set(("extractor", "tags-workers"), workers)
+                    tags = [msg[2]["tags_artist"]
+                            for msg in extr if msg[0] == Message.Url]
+                    config.unset(("extractor", "tags-workers"))
+                    self.assertEqual(tags, [str(num) for num in range(20)])
+
+                    # only files passing all predicates get looked up
+                    expected = ["1", "2", "3", "5"]
+                    self.assertEqual(run(workers, **{
+                        "image-range": "2-5",
+                        "image-filter": "id != 4",
+                    }), (expected, expected))
+
+                    # ... unless the filter needs their tags
+                    tags, fetched = run(workers, **{
+                        "image-range": "1-2",
+                        "image-filter": "tags_artist != '0'",
+                    })
+                    self.assertEqual(tags, ["1", "2"])
+                    self.assertLessEqual(len(fetched), 3 + workers)
+
+            # tags get stored by post ID in the cache database
+            with tempfile.TemporaryDirectory() as tmpdir, \
+                    patch.object(deco, "path", tmpdir + "/cache.sqlite3"), \
+                    patch.object(deco, "_local", threading.local()), \
+                    patch.object(booru.TagCache, "_init", True):
+                expected = ["1", "2", "3", "4", "5"]
+                self.assertEqual(
+                    run(4, **{"image-range": "2-6"}), (expected, expected))
+                booru.TagCache.cursor().execute(
+                    "DELETE FROM booru_tags WHERE id = '4'")
+                self.assertEqual(
+                    run(4, **{"image-range": "2-6"}), (expected, ["4"]))
+                self.assertEqual(
+                    run(1, **{"image-range": "2-6"}), (expected, []))
+                deco.connection().close()
+        finally:
+            config.unset(("extractor", "tags"))
+
+    def test_nozomi_ids(self):
+        from gallery_dl.extractor import nozomi
+
+        def ids(*values):
+            return array.array(nozomi.TYPECODE, values)
+
+        unpack = nozomi.NozomiExtractor._unpack
+        self.assertEqual(unpack(b""), ids())
+        self.assertEqual(unpack(b"\x00\x00\x00"), ids())
+        self.assertEqual(
+            unpack(b"\x00\x00\x00\x01\x00\x00\x01\x00\xff\xff\xff\xff\x00"),
+            ids(1, 256, 0xFFFFFFFF))
+
+        # .nozomi files list posts in descending order
+        self.assertEqual(nozomi._ascending(ids()), ids())
+        self.assertEqual(nozomi._ascending(ids(9, 5, 3, 1)), ids(1, 3, 5, 9))
+        self.assertEqual(nozomi._ascending(ids(5, 9, 1, 3)), ids(1, 3, 5, 9))
+
+        a = ids(1, 3, 5, 7, 9, 11)
+        b = ids(2, 3, 4, 9, 10)
+        self.assertEqual(nozomi._intersection(a, b), ids(3, 9))
+        self.assertEqual(nozomi._intersection(b, a), ids(3, 9))
+        self.assertEqual(nozomi._intersection(a, a), a)
+        self.assertEqual(nozomi._intersection(a, ids()), ids())
+        self.assertEqual(nozomi._intersection(ids(), a), ids())
+        self.assertEqual(nozomi._intersection(a, ids(11, 12)), ids(11))
+
+        self.assertEqual(nozomi._difference(a, b), ids(1, 5, 7, 11))
+        self.assertEqual(nozomi._difference(b, a), ids(2, 4, 10))
+        self.assertEqual(nozomi._difference(a, a), ids())
+        self.assertEqual(nozomi._difference(a, ids()), a)
+        self.assertEqual(nozomi._difference(ids(), a), ids())
+        self.assertEqual(nozomi._difference(a, ids(0, 1, 2)),
+                         ids(3, 5, 7, 9, 11))
+
+        # results of descending inputs once put in order
+        self.assertEqual(
+            nozomi._intersection(nozomi._ascending(ids(11, 9, 3)),
+                                 nozomi._ascending(ids(10, 9, 4, 3))),
+            ids(3, 9))
+
+    def test_nozomi_resolve(self):
+        from gallery_dl.extractor import nozomi
+
+        class ResolveExtractor(nozomi.NozomiExtractor):
+            pattern = "resolve:"
+
+            def _post(self, post_id):
+                with lock:
+                    requested.append(post_id)
+                # finish out of order
+                time.sleep((int(post_id) % 3) * 0.01)
+                return {"postid": post_id}
+
+        lock = threading.Lock()
+        post_ids = [str(num) for num in range(50)]
+        for workers in (1, 4):
+            config.set(("extractor", "workers"), workers)
+            try:
+                extr = ResolveExtractor.from_url("resolve:")
+
+                # results in order
+                requested = []
+                posts = [post["postid"]
+                         for post in extr._resolve(iter(post_ids))]
+                self.assertEqual(posts, post_ids)
+                self.assertEqual(sorted(requested, key=int), post_ids)
+
+                # stopping early requests at most 'workers * 2' more posts
+                requested = []
+                results = extr._resolve(iter(post_ids))
+                for _ in range(5):
+                    next(results)
+                results.close()
+                time.sleep(0.05)
+                self.assertLessEqual(len(requested), 5 + workers * 2)
+            finally:
+                config.unset(("extractor", "workers"))
+
     def test_docstrings(self):
         """ensure docstring uniqueness"""
         for extr1 in extractor.extractors():
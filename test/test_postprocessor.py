@@ -9,13 +9,17 @@
 
 import os.path
 import zipfile
+import json
+import gzip
+import hashlib
+import sqlite3
 import tempfile
 from datetime import datetime, timezone as tz
 
 import unittest
 from unittest.mock import Mock, mock_open, patch
 
-from gallery_dl import postprocessor, extractor, util, config
+from gallery_dl import postprocessor, extractor, util, config, job
 from gallery_dl.postprocessor.common import PostProcessor
 
 
@@ -80,6 +84,108 @@ class BasePostprocessorTest(unittest.TestCase):
         return pp(self.pathfmt, options)
 
 
+class CatalogTest(BasePostprocessorTest):
+
+    def test_catalog(self):
+        path = os.path.join(self.dir.name, "catalog.sqlite3")
+        options = {"database": path, "fields": ["id", "artist"],
+                   "indexes": ["id"], "batch-size": 2}
+
+        pp = self._create(options)
+        for num, artist, tags in (
+            (1, "foo", ["long_hair", "blue_eyes"]),
+            (2, "bar", "short_hair blue_eyes"),
+            (3, "foo", None),
+        ):
+            self.pathfmt.set_filename({
+                "filename": "file{}".format(num), "extension": "jpg",
+                "id": num, "artist": artist, "tags": tags, "_private": 1})
+            pp.prepare(self.pathfmt)
+            pp.run_after(self.pathfmt)
+        directory = self.pathfmt.realdirectory
+
+        # replace an existing entry
+        self.pathfmt.set_filename({"filename": "file1", "extension": "jpg",
+                                   "id": 1, "artist": "baz", "tags": "red"})
+        pp.run_after(self.pathfmt)
+        pp.finalize()
+
+        from gallery_dl.postprocessor import catalog
+
+        def query(expr):
+            return [p[len(directory):] for p in catalog.query(expr, path)]
+
+        self.assertEqual(query(""), ["file1.jpg", "file2.jpg", "file3.jpg"])
+        self.assertEqual(query("artist:foo"), ["file3.jpg"])
+        self.assertEqual(query("id:2"), ["file2.jpg"])
+        self.assertEqual(query("blue_eyes"), ["file2.jpg"])
+        self.assertEqual(query("red"), ["file1.jpg"])
+        self.assertEqual(query("hair"), [])
+        self.assertEqual(query("short_hair artist:bar"), ["file2.jpg"])
+        self.assertEqual(query("extension:jpg id:3"), ["file3.jpg"])
+        self.assertEqual(query("_private:1"), [])
+
+        # add another field to an existing database
+        options["fields"].append("extension")
+        pp = self._create(options)
+        pp.finalize()
+        db = catalog.connect(path)
+        self.assertEqual(
+            [row[1] for row in db.execute("PRAGMA table_info(files)")],
+            ["path", "metadata", "id", "artist", "extension"])
+        self.assertEqual(
+            [row[0] for row in db.execute(
+                "SELECT name FROM sqlite_master WHERE type='index' "
+                "AND name LIKE 'files_%'")],
+            ["files_id"])
+        db.close()
+
+    def test_catalog_tags(self):
+        path = os.path.join(self.dir.name, "tags.sqlite3")
+        pp = self._create({"database": path})
+        tags = [":d", "fate/stay_night", "-_-", "^_^", "c.c.",
+                "long_hair", "re:zero", "\"quoted\"", "OR"]
+        for num, tag in enumerate(tags):
+            self.pathfmt.set_filename({
+                "filename": "file{}".format(num), "extension": "jpg",
+                "tags": [tag, "common"]})
+            pp.run_after(self.pathfmt)
+        pp.finalize()
+
+        from gallery_dl.postprocessor import catalog
+        directory = self.pathfmt.realdirectory
+
+        def query(expr):
+            return [p[len(directory):] for p in catalog.query(expr, path)]
+
+        for num, tag in enumerate(tags):
+            if ":" in tag[1:]:
+                tag = "tag:" + tag
+            expr = '"{}"'.format(tag.replace("\"", "\\\""))
+            self.assertEqual(query(expr), ["file{}.jpg".format(num)], tag)
+            self.assertEqual(query("common " + expr),
+                             ["file{}.jpg".format(num)], tag)
+        self.assertEqual(query("hair"), [])
+        self.assertEqual(query("stay_night"), [])
+        self.assertEqual(len(query("common")), len(tags))
+
+    def test_catalog_unlocked(self):
+        path = os.path.join(self.dir.name, "unlocked.sqlite3")
+        pp = self._create({"database": path})
+        self.pathfmt.set_filename({"filename": "file", "extension": "jpg"})
+        pp.run_after(self.pathfmt)
+
+        # other processes can write while a batch is being collected
+        db = sqlite3.connect(path, timeout=0, isolation_level=None)
+        db.execute("INSERT INTO files (path) VALUES ('other')")
+        pp.finalize()
+
+        paths = [row[0] for row in db.execute(
+            "SELECT path FROM files ORDER BY path")]
+        db.close()
+        self.assertEqual(paths, [self.pathfmt.realpath, "other"])
+
+
 class ClassifyTest(BasePostprocessorTest):
 
     def test_classify_default(self):
@@ -134,6 +240,302 @@ class ClassifyTest(BasePostprocessorTest):
             mkdirs.assert_called_once_with(path, exist_ok=True)
 
 
+class DedupTest(BasePostprocessorTest):
+
+    def _download(self, pp, directory, content, kwdict=None):
+        self.pathfmt.set_directory({"category": directory})
+        self.pathfmt.set_filename(dict(
+            kwdict or (), filename="file", extension="jpg"))
+        pp.prepare(self.pathfmt)
+        with open(self.pathfmt.realpath, "wb") as file:
+            file.write(content)
+        self.pathfmt.kwdict["_download"] = (self.pathfmt.realpath, {})
+        pp.run_after(self.pathfmt)
+        return self.pathfmt.realpath
+
+    def test_dedup_hardlink(self):
+        store = os.path.join(self.dir.name, "objects")
+        pp = self._create({"directory": store})
+        sha256 = hashlib.sha256(b"foo").hexdigest()
+
+        path1 = self._download(pp, "a", b"foo")
+        path2 = self._download(
+            pp, "b", b"foo", {"md5": "ACBD18DB4CC2F85CEDEF654FCCC4A4D8",
+                              "_original": True})
+        path3 = self._download(pp, "c", b"bar")
+        pp.finalize()
+
+        obj = os.path.join(store, sha256[:2], sha256)
+        self.assertTrue(os.path.samefile(path1, obj))
+        self.assertTrue(os.path.samefile(path2, obj))
+        self.assertFalse(os.path.samefile(path3, obj))
+        self.assertEqual(os.stat(obj).st_nlink, 3)
+
+        db = sqlite3.connect(os.path.join(store, "index.sqlite3"))
+        self.assertEqual(sorted(db.execute(
+            "SELECT * FROM objects WHERE object=?", (obj,))), [
+            ("md5", "acbd18db4cc2f85cedef654fccc4a4d8", obj),
+            ("sha256", sha256, obj),
+        ])
+        db.close()
+
+    def test_dedup_lookup(self):
+        store = os.path.join(self.dir.name, "lookup")
+        md5 = hashlib.md5(b"baz").hexdigest()
+        pp = self._create({"directory": store})
+        path1 = self._download(pp, "l1", b"baz",
+                               {"md5": md5, "_original": True})
+
+        # same advertised checksum in a different location
+        self.pathfmt.set_directory({"category": "l2"})
+        self.pathfmt.set_filename({
+            "filename": "file", "extension": "jpg", "md5": md5.upper(),
+            "_original": True})
+        self.assertFalse(self.pathfmt.exists())
+        pp.prepare(self.pathfmt)
+        self.assertTrue(self.pathfmt.exists())
+        self.assertTrue(os.path.samefile(self.pathfmt.realpath, path1))
+
+        # checksum of a different file, e.g. a sample
+        for original in (False, None):
+            self.pathfmt.set_filename({
+                "filename": "sample", "extension": "webm", "md5": md5,
+                "_original": original})
+            pp.prepare(self.pathfmt)
+            self.assertFalse(self.pathfmt.exists())
+
+        # unknown checksum
+        self.pathfmt.set_filename({
+            "filename": "other", "extension": "jpg", "md5": "0" * 32})
+        pp.prepare(self.pathfmt)
+        self.assertFalse(self.pathfmt.exists())
+
+        # disabled
+        pp.finalize()
+        pp = self._create({"directory": store, "lookup": False})
+        self.pathfmt.set_directory({"category": "l3"})
+        self.pathfmt.set_filename({
+            "filename": "file", "extension": "jpg", "md5": md5})
+        pp.prepare(self.pathfmt)
+        self.assertFalse(self.pathfmt.exists())
+        pp.finalize()
+
+    def test_dedup_symlink(self):
+        store = os.path.join(self.dir.name, "symlinks")
+        pp = self._create({"directory": store, "link": "symlink",
+                           "hash": "md5"})
+        md5 = hashlib.md5(b"foobar").hexdigest()
+
+        path1 = self._download(pp, "s1", b"foobar",
+                               {"md5": md5, "_original": True})
+        path2 = self._download(pp, "s2", b"foobar")
+        pp.finalize()
+
+        obj = os.path.join(store, md5[:2], md5)
+        for path in (path1, path2):
+            self.assertTrue(os.path.islink(path))
+            self.assertEqual(os.readlink(path), obj)
+        with open(path2, "rb") as file:
+            self.assertEqual(file.read(), b"foobar")
+
+    def test_dedup_replaced(self):
+        store = os.path.join(self.dir.name, "replaced")
+        pp = self._create({"directory": store})
+        md5 = hashlib.md5(b"zip").hexdigest()
+
+        # another postprocessor replaced the downloaded file
+        self.pathfmt.set_directory({"category": "replaced"})
+        self.pathfmt.set_filename({"filename": "file", "extension": "zip",
+                                   "md5": md5, "_original": True})
+        kwdict = self.pathfmt.kwdict
+        kwdict["_download"] = (self.pathfmt.realpath, {"sha256": "0" * 64})
+        self.pathfmt.set_extension("webm")
+        with open(self.pathfmt.realpath, "wb") as file:
+            file.write(b"webm")
+        pp.run_after(self.pathfmt)
+        pp.finalize()
+
+        sha256 = hashlib.sha256(b"webm").hexdigest()
+        obj = os.path.join(store, sha256[:2], sha256)
+        self.assertTrue(os.path.samefile(self.pathfmt.realpath, obj))
+        db = sqlite3.connect(os.path.join(store, "index.sqlite3"))
+        self.assertEqual(list(db.execute("SELECT * FROM objects")),
+                         [("sha256", sha256, obj)])
+        db.close()
+
+    def test_dedup_overwrite(self):
+        for mode in ("hardlink", "symlink"):
+            store = os.path.join(self.dir.name, "overwrite-" + mode)
+            pp = self._create({"directory": store, "link": mode})
+            path1 = self._download(pp, mode + "1", b"foo")
+            path2 = self._download(pp, mode + "2", b"foo")
+            path3 = self._download(pp, mode + "3", b"foo")
+            pp.finalize()
+
+            # downloading a file again doesn't change its copies
+            with self.pathfmt.open("wb") as file:
+                file.write(b"bar")
+            self.pathfmt.set_directory({"category": mode + "2"})
+            self.pathfmt.set_filename({"filename": "file",
+                                       "extension": "jpg"})
+            with self.pathfmt.open("r+b") as file:
+                file.seek(3)
+                file.write(b"baz")
+
+            for path, content in ((path1, b"foo"), (path2, b"foobaz"),
+                                  (path3, b"bar")):
+                with open(path, "rb") as file:
+                    self.assertEqual(file.read(), content, path)
+            self.assertFalse(os.path.islink(path2))
+            self.assertFalse(os.path.islink(path3))
+
+    def test_dedup_job(self):
+        store = os.path.join(self.dir.name, "job")
+        archive = os.path.join(self.dir.name, "dedup.sqlite3")
+        config.set(("postprocessors",), [
+            {"name": "dedup", "directory": store},
+            {"name": "metadata"},
+        ])
+        config.set(("extractor", "archive"), archive)
+        config.set(("extractor", "archive-format"), "{id}")
+        config.set(("extractor", "skip"), "abort:1")
+        try:
+            djob = job.DownloadJob(self.extractor)
+            djob.initialize({"category": "job"})
+            downloads = []
+
+            def download(url):
+                downloads.append(url)
+                with open(djob.pathfmt.temppath, "w") as file:
+                    file.write("content")
+                djob.pathfmt.kwdict["_download"] = (
+                    djob.pathfmt.realpath, {})
+                return True
+            djob.download = download
+
+            # identical files with the same advertised checksum
+            md5 = hashlib.md5(b"content").hexdigest()
+            for num in range(3):
+                djob.handle_url("url{}".format(num), {
+                    "category": "job", "id": num, "md5": md5,
+                    "_original": True,
+                    "filename": "file{}".format(num), "extension": "txt"})
+            djob.handle_finalize()
+        finally:
+            config.unset(("postprocessors",))
+            config.unset(("extractor", "archive"))
+            config.unset(("extractor", "archive-format"))
+            config.unset(("extractor", "skip"))
+
+        # only the first file got downloaded, but all count as completed
+        self.assertEqual(downloads, ["url0"])
+        path = os.path.join(self.dir.name, "job", "")
+        for num in range(3):
+            filename = path + "file{}.txt".format(num)
+            self.assertTrue(os.path.samefile(filename, path + "file0.txt"))
+            self.assertTrue(os.path.exists(filename + ".json"))
+        with sqlite3.connect(archive) as db:
+            entries = [row[0] for row in db.execute(
+                "SELECT entry FROM archive ORDER BY entry")]
+        self.assertEqual(entries, ["test0", "test1", "test2"])
+
+
+class ExecTest(BasePostprocessorTest):
+
+    def _run(self, pp, names, directory=None):
+        for name in names:
+            if directory:
+                self.pathfmt.set_directory({"category": directory})
+            self.pathfmt.set_filename({"filename": name, "extension": "jpg"})
+            pp.prepare(self.pathfmt)
+            pp.run_after(self.pathfmt)
+
+    def test_exec_default(self):
+        pp = self._create({"command": ["echo", "{_path}"]})
+        with patch("subprocess.Popen") as p:
+            p.return_value.wait.return_value = 0
+            self._run(pp, ("a", "b"))
+            pp.finalize()
+
+        self.assertEqual(p.call_count, 2)
+        p.assert_called_with(
+            ["echo", self.pathfmt.realpath], shell=False)
+
+    def test_exec_batch(self):
+        pp = self._create({"command": ["cmd", "{extension}", "-i", "{_path}"],
+                           "batch": 2})
+        with patch("subprocess.Popen") as p:
+            p.return_value.wait.return_value = 0
+            self._run(pp, ("a", "b", "c"))
+            self.assertEqual(p.call_count, 1)
+            pp.finalize()
+
+        d = self.pathfmt.realdirectory
+        self.assertEqual(p.call_args_list[0][0][0], [
+            "cmd", "jpg", "-i", d + "a.jpg", d + "b.jpg"])
+        self.assertEqual(p.call_args_list[1][0][0], [
+            "cmd", "jpg", "-i", d + "c.jpg"])
+
+    def test_exec_batch_directory(self):
+        pp = self._create({"command": "cmd {} --", "batch": "directory"})
+        with patch("subprocess.Popen") as p:
+            p.return_value.wait.return_value = 0
+            self._run(pp, ("a", "b"), "foo")
+            d1 = self.pathfmt.realdirectory
+            self._run(pp, ("c",), "bar")
+            d2 = self.pathfmt.realdirectory
+            self.assertEqual(p.call_count, 1)
+            pp.finalize()
+
+        self.assertEqual(p.call_count, 2)
+        self.assertEqual(p.call_args_list[0][0][0], "cmd {} {} --".format(
+            d1 + "a.jpg", d1 + "b.jpg"))
+        self.assertEqual(p.call_args_list[1][0][0], "cmd {} --".format(
+            d2 + "c.jpg"))
+
+    def test_exec_batch_append(self):
+        pp = self._create({"command": ["cmd", "{_directory}"], "batch": 5})
+        with patch("subprocess.Popen") as p:
+            p.return_value.wait.return_value = 0
+            self._run(pp, ("a", "b"))
+            pp.finalize()
+
+        d = self.pathfmt.realdirectory
+        p.assert_called_once_with(
+            ["cmd", d, d + "a.jpg", d + "b.jpg"], shell=False)
+
+    def test_exec_async(self):
+        pp = self._create({"command": ["cmd", "{_filename}"], "async": 2})
+        procs = []
+
+        def popen(args, shell):
+            proc = Mock()
+            proc.args = args
+            proc.poll.return_value = None
+            proc.wait.return_value = 1
+            procs.append(proc)
+            return proc
+
+        with patch("subprocess.Popen", side_effect=popen):
+            self._run(pp, ("a", "b"))
+            self.assertEqual(len(pp.processes), 2)
+            procs[0].wait.assert_not_called()
+
+            # wait for the oldest process before starting another one
+            procs[1].poll.return_value = 0
+            self._run(pp, ("c", "d"))
+            procs[0].wait.assert_called_once_with()
+            procs[1].wait.assert_called_once_with()
+            self.assertEqual(len(pp.processes), 2)
+
+            with self.assertLogs(pp.log, "WARNING") as log:
+                pp.finalize()
+        self.assertEqual(pp.processes, [])
+        for proc in procs:
+            proc.wait.assert_called_once_with()
+        self.assertIn("cmd d.jpg", log.output[-1])
+
+
 class MetadataTest(BasePostprocessorTest):
 
     def test_metadata_default(self):
@@ -231,6 +633,44 @@ class MetadataTest(BasePostprocessorTest):
             pp.run(self.pathfmt)
         self.assertEqual(self._output(m), "bar\nNone\n")
 
+    def test_metadata_jsonl(self):
+        pp = self._create({"mode": "jsonl"}, {"foo": "bar"})
+        self.assertEqual(pp.run, pp._run_jsonl)
+
+        for num in range(3):
+            self.pathfmt.kwdict["num"] = num
+            pp.prepare(self.pathfmt)
+            pp.run(self.pathfmt)
+        pp.finalize()
+
+        path = os.path.join(self.pathfmt.realdirectory, "metadata.jsonl")
+        with open(path, encoding="utf-8") as file:
+            lines = file.readlines()
+        os.unlink(path)
+
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(lines[0], (
+            '{"_path":"' + self.pathfmt.realpath + '","category":"test",'
+            '"extension":"ext","filename":"file","foo":"bar","num":0}\n'))
+        self.assertEqual(json.loads(lines[2])["num"], 2)
+
+    def test_metadata_jsonl_gzip(self):
+        path = os.path.join(self.dir.name, "metadata.jsonl.gz")
+        pp = self._create({"mode": "jsonl", "file": path})
+
+        for _ in range(2):
+            pp.prepare(self.pathfmt)
+            pp.run(self.pathfmt)
+            pp.finalize()
+
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            records = [json.loads(line) for line in file]
+        os.unlink(path)
+
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0], records[1])
+        self.assertEqual(records[0]["_path"], self.pathfmt.realpath)
+
     @staticmethod
     def _output(mock):
         return "".join(
@@ -291,10 +731,46 @@ class ZipTest(BasePostprocessorTest):
         self.assertEqual(pp.delete, True)
         self.assertEqual(pp.path, self.pathfmt.realdirectory)
         self.assertEqual(pp.run, pp._write_safe)
-        self.assertEqual(pp.args, (
-            pp.path[:-1] + ".zip", "a", zipfile.ZIP_STORED, True,
-        ))
-        self.assertTrue(pp.args[0].endswith("/test.zip"))
+        self.assertTrue(pp.zfile.filename.endswith("/test.zip"))
+        self.assertEqual(pp.journal.name, pp.zfile.filename + ".index")
+        pp.finalize()
+        self.assertFalse(os.path.exists(pp.journal.name))
+
+    def test_zip_safe_recover(self):
+        path = os.path.join(self.dir.name, "safe.zip")
+        with zipfile.ZipFile(path, "w") as zfile:
+            zfile.writestr("file0.ext", b"foo")
+
+        data = {"category": "safe"}
+        pp = self._create({"mode": "safe", "compression": "zip"}, data)
+        with tempfile.NamedTemporaryFile("w", dir=self.dir.name) as file:
+            file.write("foobar\n" * 10)
+            file.flush()
+            for i in range(1, 4):
+                self.pathfmt.temppath = file.name
+                self.pathfmt.filename = "file{}.ext".format(i)
+                pp.prepare(self.pathfmt)
+                pp.run(self.pathfmt)
+
+        # simulate a crash after writing half of the next file
+        pp.zfile.fp.write(b"PK\x03\x04 incomplete")
+        pp.zfile.fp.flush()
+        with open(pp.journal.name) as file:
+            self.assertEqual(len(file.readlines()), 4)
+        self.assertFalse(zipfile.is_zipfile(path))
+
+        with patch.object(type(pp), "_recover") as recover:
+            pp = self._create({"mode": "safe"}, data)
+            recover.assert_not_called()
+        self.assertEqual(pp.zfile.namelist(), [
+            "file0.ext", "file1.ext", "file2.ext", "file3.ext"])
+        pp.finalize()
+
+        with zipfile.ZipFile(path) as zfile:
+            self.assertIsNone(zfile.testzip())
+            self.assertEqual(zfile.read("file0.ext"), b"foo")
+            self.assertEqual(zfile.read("file3.ext"), b"foobar\n" * 10)
+        os.unlink(path)
 
     def test_zip_write(self):
         pp = self._create()
@@ -371,6 +847,328 @@ class ZipTest(BasePostprocessorTest):
             self.assertRegex(args[1], r"file\d\.ext")
         self.assertEqual(pp.zfile.close.call_count, 1)
 
+    def test_zip_stream(self):
+        pp = self._create({"mode": "stream", "compression": "zip"},
+                          {"category": "stream"})
+        self.assertEqual(pp.run, pp._write_stream)
+        self.assertIs(self.pathfmt.writer, pp)
+        nti = pp.zfile.NameToInfo
+
+        for i in range(3):
+            self.pathfmt.set_filename({"filename": "file{}".format(i),
+                                       "extension": "jpg"})
+            pp.prepare(self.pathfmt)
+            with self.pathfmt.open() as file:
+                file.write(b"\x89PNG\r\n\x1a\n" + b"foo" * i)
+                # header check of the HTTP downloader
+                file.seek(0)
+                self.assertEqual(file.read(8), b"\x89PNG\r\n\x1a\n")
+                self.pathfmt.set_extension("png")
+            pp.run(self.pathfmt)
+
+            self.assertIn("file{}.png".format(i), nti)
+            self.assertEqual(self.pathfmt.temppath, self.pathfmt.realpath)
+            self.assertFalse(self.pathfmt.delete)
+            self.pathfmt.finalize()
+        self.assertFalse(os.path.exists(self.pathfmt.realpath))
+
+        # retried and failed downloads
+        self.pathfmt.set_filename({"filename": "retry", "extension": "txt"})
+        pp.prepare(self.pathfmt)
+        with self.pathfmt.open() as file:
+            file.write(b"incomplete")
+        with self.pathfmt.open() as file:
+            file.write(b"complete")
+        pp.run(self.pathfmt)
+
+        self.pathfmt.set_filename({"filename": "fail", "extension": "txt"})
+        pp.prepare(self.pathfmt)
+        with self.pathfmt.open() as file:
+            file.write(b"incomplete")
+        pp.discard(self.pathfmt)
+        self.assertNotIn("fail.txt", nti)
+        pp.finalize()
+
+        with zipfile.ZipFile(pp.zfile.filename) as zfile:
+            self.assertEqual(zfile.namelist(), [
+                "file0.png", "file1.png", "file2.png", "retry.txt"])
+            self.assertIsNone(zfile.testzip())
+            self.assertEqual(zfile.read("file2.png")[8:], b"foofoo")
+            self.assertEqual(zfile.read("retry.txt"), b"complete")
+        os.unlink(pp.zfile.filename)
+
+    def test_zip_stream_unsupported(self):
+        with patch("sys.version_info", (3, 5, 0)):
+            pp = self._create({"mode": "stream"}, {"category": "stream35"})
+        self.assertEqual(pp.run, pp._write)
+        self.assertIsNone(self.pathfmt.writer)
+        pp.finalize()
+
+    def test_zip_recover(self):
+        path = os.path.join(self.dir.name, "recover.zip")
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zfile:
+            zfile.writestr("file1.ext", b"foo" * 100)
+            zfile.writestr("file2.ext", b"bar")
+            with zfile.open("file3.ext", "w", force_zip64=True) as file:
+                file.write(b"baz")
+            offset = zfile.start_dir
+
+        # remove central directory and add an incomplete entry
+        with open(path, "r+b") as fp:
+            fp.seek(offset)
+            fp.truncate()
+            zinfo = zipfile.ZipInfo("file4.ext")
+            zinfo.CRC = zinfo.compress_size = zinfo.file_size = 0
+            fp.write(zinfo.FileHeader() + b"data")
+        self.assertFalse(zipfile.is_zipfile(path))
+
+        pp = self._create(None, {"category": "recover"})
+        self.assertEqual(pp.zfile.namelist(),
+                         ["file1.ext", "file2.ext", "file3.ext"])
+        pp.finalize()
+
+        with zipfile.ZipFile(path) as zfile:
+            self.assertIsNone(zfile.testzip())
+            self.assertEqual(zfile.read("file1.ext"), b"foo" * 100)
+            self.assertEqual(zfile.read("file3.ext"), b"baz")
+        os.unlink(path)
+
+    def test_zip_recover_invalid(self):
+        path = os.path.join(self.dir.name, "invalid.zip")
+
+        def entry(name, data, csize=None, usize=None):
+            zinfo = zipfile.ZipInfo(name)
+            zinfo.CRC = zipfile.crc32(data)
+            zinfo.compress_size = len(data) if csize is None else csize
+            zinfo.file_size = len(data) if usize is None else usize
+            return zinfo.FileHeader() + data
+
+        for invalid in (
+            # followed by data starting with 'PK'
+            entry("file2.ext", b"PK\x00\x00data", 0, 0),
+            # stored with different sizes
+            entry("file2.ext", b"data", 4, 8),
+            # truncated
+            entry("file2.ext", b"data", 8, 8)[:-4],
+        ):
+            with open(path, "wb") as fp:
+                fp.write(entry("file1.ext", b"foo"))
+                fp.write(invalid)
+            self.assertFalse(zipfile.is_zipfile(path))
+
+            pp = self._create(None, {"category": "invalid"})
+            self.assertEqual(pp.zfile.namelist(), ["file1.ext"])
+            pp.finalize()
+
+            with zipfile.ZipFile(path) as zfile:
+                self.assertIsNone(zfile.testzip())
+                self.assertEqual(zfile.read("file1.ext"), b"foo")
+            os.unlink(path)
+
+
+class UgoiraTest(BasePostprocessorTest):
+
+    def test_ugoira_stream(self):
+        frames = [{"file": "000000.jpg", "delay": 100},
+                  {"file": "000001.jpg", "delay": 50}]
+        pp = self._create({"stream": True, "extension": "webm"},
+                          {"frames": frames, "extension": "zip"})
+        self.assertTrue(pp.stream)
+
+        path = os.path.join(self.dir.name, "ugoira.zip")
+        with zipfile.ZipFile(path, "w") as zfile:
+            zfile.writestr("000000.jpg", b"foo")
+            zfile.writestr("000001.jpg", b"barbaz")
+
+        urls = pp._frame_urls(path, frames)
+        with open(path, "rb") as fp:
+            data = fp.read()
+        for url, content in zip(urls, (b"foo", b"barbaz")):
+            start, end = url.split(",")[3:6:2]
+            self.assertEqual(data[int(start):int(end)], content)
+            self.assertTrue(url.endswith(",:" + path))
+
+        script = pp._ffconcat(frames, urls)
+        self.assertEqual(script, (
+            "ffconcat version 1.0\n"
+            "file '{0}'\nduration 0.1\n"
+            "file '{1}'\nduration 0.05\n"
+            "file '{1}'\n").format(*urls))
+
+    def test_ugoira_stream_compressed(self):
+        frames = [{"file": "000000.jpg", "delay": 100}]
+        pp = self._create({"stream": True})
+
+        path = os.path.join(self.dir.name, "deflated.zip")
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zfile:
+            zfile.writestr("000000.jpg", b"foo")
+        self.assertIsNone(pp._frame_urls(path, frames))
+        self.assertIsNone(pp._frame_urls(path + ".missing", frames))
+
+    def _ugoira(self, options):
+        frames = [{"file": "000000.jpg", "delay": 100}]
+        pp = self._create(options, {"frames": frames, "extension": "zip"})
+        self.pathfmt.set_directory(self.pathfmt.kwdict)
+        with zipfile.ZipFile(self.pathfmt.temppath, "w") as zfile:
+            zfile.writestr("000000.jpg", b"foo")
+        return pp
+
+    @staticmethod
+    def _exec(args, stdin=None):
+        with open(args[-1], "w") as file:
+            file.write("video")
+        return 0
+
+    def test_ugoira_cache(self):
+        cache = os.path.join(self.dir.name, "cache")
+        pp = self._ugoira({"cache": cache})
+        zippath = self.pathfmt.temppath
+
+        with patch.object(pp, "_exec", side_effect=self._exec) as exe:
+            pp.prepare(self.pathfmt)
+            pp.run(self.pathfmt)
+            self.assertEqual(exe.call_count, 1)
+        self.assertTrue(self.pathfmt.delete)
+        self.pathfmt.finalize()
+        self.assertFalse(os.path.exists(zippath))
+
+        frames = [{"file": "000000.jpg", "delay": 100}]
+        files = os.listdir(cache)
+        self.assertEqual(len(files), 1)
+        self.assertTrue(files[0].endswith(".webm"))
+
+        # same content and parameters: reuse cached result
+        pp = self._ugoira({"cache": cache})
+        os.unlink(self.pathfmt.realpath[:-3] + "webm")
+        with patch.object(pp, "_exec") as exe:
+            pp.prepare(self.pathfmt)
+            pp.run(self.pathfmt)
+            exe.assert_not_called()
+        with open(self.pathfmt.realpath) as file:
+            self.assertEqual(file.read(), "video")
+
+        # different parameters: convert again
+        pp = self._ugoira({"cache": cache, "ffmpeg-args": ["-an"]})
+        self.assertNotEqual(pp._cache_key(zippath, frames), files[0])
+
+    def test_ugoira_workers(self):
+        pp = self._ugoira({"workers": 4, "keep-files": True})
+        self.assertIsNotNone(pp.pool)
+        zippath = self.pathfmt.temppath
+
+        with patch.object(pp, "_exec", side_effect=self._exec):
+            pp.prepare(self.pathfmt)
+            pp.run(self.pathfmt)
+            self.assertEqual(self.pathfmt.temppath, self.pathfmt.realpath)
+            self.assertFalse(self.pathfmt.delete)
+            pp.finalize()
+        self.assertEqual(pp.futures, [])
+
+        self.assertTrue(os.path.exists(zippath))
+        with open(self.pathfmt.realpath) as file:
+            self.assertEqual(file.read(), "video")
+
+
+class BackgroundTest(BasePostprocessorTest):
+
+    def setUp(self):
+        config.set(("postprocessors",), [
+            {"name": "mtime"},
+            {"name": "metadata", "background": True},
+        ])
+
+    def tearDown(self):
+        config.unset(("postprocessors",))
+
+    def test_background_steps(self):
+        djob = job.DownloadJob(self.extractor)
+        djob.initialize({"category": "test"})
+        mtime, metadata = djob.postprocessors
+
+        self.assertEqual(djob.steps, [mtime.run])
+        self.assertEqual(djob.background.maxsize, 8)
+        self.assertTrue(djob._background_thread.is_alive())
+        djob.handle_finalize()
+        self.assertIsNone(djob.background)
+
+    def test_background_download(self):
+        djob = job.DownloadJob(self.extractor)
+        djob.initialize({"category": "test"})
+
+        def download(url):
+            with open(djob.pathfmt.temppath, "w") as file:
+                file.write(url)
+            return True
+        djob.download = download
+
+        kwdict = {"category": "test", "extension": "txt"}
+        for num in range(3):
+            kwdict["filename"] = "file{}".format(num)
+            djob.handle_url("foo{}".format(num), kwdict)
+        djob.handle_finalize()
+
+        for num in range(3):
+            path = os.path.join(
+                self.dir.name, "test", "file{}.txt".format(num))
+            with open(path) as file:
+                self.assertEqual(file.read(), "foo{}".format(num))
+            with open(path + ".json") as file:
+                self.assertIn('"filename": "file{}"'.format(num), file.read())
+
+
+class DeferredTest(BasePostprocessorTest):
+
+    def setUp(self):
+        config.set(("postprocessors",), [
+            {"name": "ugoira", "workers": 2},
+            {"name": "metadata"},
+        ])
+        config.set(("extractor", "archive"),
+                   os.path.join(self.dir.name, "archive.sqlite3"))
+        config.set(("extractor", "archive-format"), "{id}")
+
+    def tearDown(self):
+        config.unset(("postprocessors",))
+        config.unset(("extractor", "archive"))
+        config.unset(("extractor", "archive-format"))
+
+    def test_deferred_conversion(self):
+        djob = job.DownloadJob(self.extractor)
+        djob.initialize({"category": "test"})
+
+        def download(url):
+            with zipfile.ZipFile(djob.pathfmt.temppath, "w") as zfile:
+                zfile.writestr("000000.jpg", b"foo")
+            return True
+        djob.download = download
+
+        def convert(args, stdin=None):
+            if "fail" in args[-1]:
+                return 1
+            with open(args[-1], "w") as file:
+                file.write("video")
+            return 0
+
+        frames = [{"file": "000000.jpg", "delay": 100}]
+        with patch("gallery_dl.postprocessor.ugoira.UgoiraPP._exec",
+                   side_effect=convert):
+            for name in ("ok", "fail"):
+                djob.handle_url("", {
+                    "category": "test", "id": name, "filename": name,
+                    "extension": "zip", "frames": frames})
+            djob.handle_finalize()
+
+        path = os.path.join(self.dir.name, "test", "")
+        self.assertTrue(os.path.exists(path + "ok.webm.json"))
+        self.assertFalse(os.path.exists(path + "fail.webm"))
+        self.assertFalse(os.path.exists(path + "fail.webm.json"))
+        self.assertTrue(os.path.exists(path + "fail.zip"))
+
+        with sqlite3.connect(config.get(("extractor", "archive"))) as db:
+            entries = [row[0] for row in db.execute(
+                "SELECT entry FROM archive")]
+        self.assertEqual(entries, ["testok"])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -11,6 +11,7 @@ import unittest
 import sys
 import random
 import string
+import datetime
 
 from gallery_dl import util, text, exception
 
@@ -64,14 +65,26 @@ class TestPredicate(unittest.TestCase):
             bool(pred(dummy, dummy))
 
         pred = util.RangePredicate("1, 3, 5")
+        self.assertEqual(pred.next_index(), 1)
         self.assertTrue(pred(dummy, dummy))
+        self.assertEqual(pred.next_index(), 3)
         self.assertFalse(pred(dummy, dummy))
         self.assertTrue(pred(dummy, dummy))
         self.assertFalse(pred(dummy, dummy))
         self.assertTrue(pred(dummy, dummy))
+        self.assertIsNone(pred.next_index())
         with self.assertRaises(exception.StopExtraction):
             bool(pred(dummy, dummy))
 
+        pred = util.RangePredicate("10-20, 100-")
+        self.assertEqual(pred.next_index(), 10)
+        pred.index = 20
+        self.assertEqual(pred.next_index(), 100)
+        self.assertFalse(pred(dummy, dummy))
+        pred.index = 99
+        self.assertTrue(pred(dummy, dummy))
+        self.assertEqual(pred.next_index(), 101)
+
         pred = util.RangePredicate("")
         with self.assertRaises(exception.StopExtraction):
             bool(pred(dummy, dummy))
@@ -93,6 +106,73 @@ class TestPredicate(unittest.TestCase):
         self.assertTrue(pred("text:123", dummy))
         self.assertTrue(pred("text:123", dummy))
 
+    def test_watermark_predicate(self):
+        url = ""
+
+        # first run
+        pred = util.WatermarkPredicate("id")
+        self.assertTrue(pred(url, {"id": 5}))
+        self.assertTrue(pred(url, {"id": "7"}))
+        self.assertTrue(pred(url, {"id": 6}))
+        self.assertTrue(pred(url, {}))
+        self.assertTrue(pred(url, {"id": "avatar"}))
+        self.assertIsNone(pred.value)
+
+        # only recorded values count
+        for kwds in ({"id": 5}, {"id": "7"}, {}, {"id": "avatar"}):
+            pred.record(kwds)
+        self.assertEqual(pred.value, 7)
+
+        # stop at the first older value
+        pred = util.WatermarkPredicate("id", 7)
+        self.assertTrue(pred(url, {"id": 9}))
+        self.assertFalse(pred.reached)
+        with self.assertRaises(exception.StopExtraction):
+            pred(url, {"id": 7})
+        self.assertTrue(pred.reached)
+        self.assertEqual(pred.value, 7)
+        pred.record({"id": 9})
+        self.assertEqual(pred.value, 9)
+
+        # tolerate older values in between
+        pred = util.WatermarkPredicate("id", 7, 2)
+        self.assertFalse(pred(url, {"id": 3}))
+        self.assertFalse(pred(url, {"id": 3}))
+        self.assertTrue(pred(url, {"id": 8}))
+        self.assertFalse(pred(url, {"id": 6}))
+        with self.assertRaises(exception.StopExtraction):
+            pred(url, {"id": 5})
+        pred.record({"id": 6})
+        self.assertEqual(pred.value, 7)
+
+    def test_date_predicate(self):
+        url = ""
+        dt = datetime.datetime
+
+        pred = util.DatePredicate("date", 1000, 2000, 1)
+        self.assertFalse(pred(url, {"date": 3000}))
+        self.assertTrue(pred(url, {"date": 2000}))
+        self.assertTrue(pred(url, {"date": dt.utcfromtimestamp(1500)}))
+        self.assertTrue(pred(url, {"date": 1000.0}))
+        self.assertTrue(pred(url, {}))
+        with self.assertRaises(exception.StopExtraction):
+            pred(url, {"date": dt.utcfromtimestamp(999)})
+
+        # pinned posts before 'dmin'
+        pred = util.DatePredicate("date", 1000, 2000)
+        self.assertFalse(pred(url, {"date": 500}))
+        self.assertFalse(pred(url, {"date": 500}))
+        self.assertFalse(pred(url, {"date": 600}))
+        self.assertTrue(pred(url, {"date": 1500}))
+        self.assertFalse(pred(url, {"date": 900}))
+        self.assertFalse(pred(url, {"date": 800}))
+        with self.assertRaises(exception.StopExtraction):
+            pred(url, {"date": 700})
+
+        pred = util.DatePredicate("date", None, 2000)
+        self.assertTrue(pred(url, {"date": 0}))
+        self.assertFalse(pred(url, {"date": 2001}))
+
     def test_filter_predicate(self):
         url = ""
 
@@ -390,6 +470,55 @@ class TestOther(unittest.TestCase):
         self.assertIs(obj.attr, obj)
         self.assertIs(obj["key"], obj)
 
+    def test_lookahead(self):
+        import threading
+        calls = []
+
+        def func(value):
+            calls.append(threading.get_ident())
+            return value * 2
+
+        for workers in (0, 4):
+            calls.clear()
+            with util.Lookahead(func, workers) as lookahead:
+                for num in range(4):
+                    lookahead.submit("k" + str(num), num)
+                lookahead.put("known", 100)
+                self.assertEqual(len(lookahead), 5)
+                if not workers:
+                    self.assertEqual(calls, [])
+                results = [lookahead.pop() for _ in range(len(lookahead))]
+
+            self.assertEqual(results, [
+                ("k0", 0), ("k1", 2), ("k2", 4), ("k3", 6), ("known", 100)])
+            self.assertEqual(len(calls), 4)
+            main = threading.get_ident()
+            if workers:
+                self.assertNotIn(main, calls)
+            else:
+                self.assertEqual(calls, [main] * 4)
+
+
+class TestDownloadArchive(unittest.TestCase):
+
+    def test_values(self):
+        class Extractor():
+            category = "test"
+            archive_fmt = "t_{tags}_{id}"
+
+            def config(self, key, default=None):
+                return default
+
+        archive = util.DownloadArchive(":memory:", Extractor())
+        for tags, id in (("a", 1), ("a", 23), ("ab", 4), ("b", 5)):
+            archive.add({"tags": tags, "id": id})
+
+        self.assertEqual(
+            sorted(archive.values({"tags": "a"}, "id")), ["1", "23"])
+        self.assertEqual(archive.values({"tags": "ab"}, "id"), ["4"])
+        self.assertEqual(archive.values({"tags": "c"}, "id"), [])
+        archive.close()
+
 
 if __name__ == '__main__':
     unittest.main()